@@ -9,14 +9,40 @@ import cv2
 import argparse
 from collections import deque
 
-from cscore import CameraServer, VideoSource, CvSource, VideoMode, CvSink, UsbCamera, CameraServer, MjpegServer
-from networktables import NetworkTablesInstance
+try:
+    from cscore import CameraServer, VideoSource, CvSource, VideoMode, CvSink, UsbCamera, CameraServer, MjpegServer
+    from networktables import NetworkTablesInstance
+except ImportError: # not on the Pi, the detectors can still be loaded by the offline tools
+    pass
+
+from framePool import getPool
+from colorLookup import ColorLookup
+from pyramidDetect import PyramidDetector
+from paramCache import ParameterCache
+from visionLog import log
 
 configFile = "/boot/frc.json"
 
 class CameraConfig: pass
 #Camera number can vary based on the model of the camera being used. 1 = Logitech C310, 2 = Microsoft Lifecam
 camera_number = 2
+#Thresholds with a table made from the HSV bounds instead of cvtColor and inRange, e.g. ColorLookup('full'). None uses cvtColor and inRange
+colorLookup = None
+#Frames wider than about twice coarseWidth are searched for balls at coarseWidth and only the crops around what was found are searched at full resolution
+pyramid = PyramidDetector(coarseWidth=160, enabled=True)
+
+# the HSV bound tuples, made once each time the bounds change
+def BallBounds(values):
+    BallLower = (values['HL'], values['SL'], values['VL'])
+    BallUpper = (values['HU'], values['SU'], values['VU'])
+    log.info('hsvBounds', "HSV lower:%s HSV Upper:%s", BallLower, BallUpper)
+    return {'lower': BallLower, 'upper': BallUpper}
+
+#HSV bounds from the dashboard, kept up to date by entry listeners once main starts listening. The defaults depend on the camera
+if camera_number == 1:
+    ballParams = ParameterCache({'HL': 26, 'HU': 35, 'SL': 71, 'SU': 255, 'VL': 53, 'VU': 154}, BallBounds)
+elif camera_number == 2:
+    ballParams = ParameterCache({'HL': 19, 'HU': 41, 'SL': 237, 'SU': 255, 'VL': 67, 'VU': 135}, BallBounds)
 
 team = 7539
 server = False
@@ -97,40 +123,42 @@ def readConfig():
     return True
 
 
-def TrackTheBall(frame, sd): # does the opencv image proccessing
+# fills maskBuf with the parts of image inside the HSV bounds, with the specks eroded away unless clean is False, and returns it
+def ThresholdBall(pool, image, hsvBuf, maskBuf, scratchBuf, lower, upper, clean=True):
+    if colorLookup is not None and colorLookup.setBounds(lower, upper): # False until the first table is built
+        mask = colorLookup.threshold(image, maskBuf)
+    else:
+        hsv = pool.check('cvtColor', cv2.cvtColor(image, cv2.COLOR_BGR2HSV, hsvBuf), hsvBuf) # creates a binary image with only the parts within the bounds True
+        mask = pool.check('inRange', cv2.inRange(hsv, lower, upper, maskBuf), maskBuf) # cuts out all the useless stuff
+    if not clean:
+        return mask
+    pool.check('erode', cv2.erode(mask, None, dst=scratchBuf, iterations = 2), scratchBuf)
+    pool.check('dilate', cv2.dilate(scratchBuf, None, dst=mask, iterations = 2), mask)
+    return mask
 
 
-    try:
-        if camera_number == 1:
-            HL = sd.getNumber('HL', 26)
-            HU = sd.getNumber('HU', 35)
-            SL = sd.getNumber('SL', 71)
-            SU = sd.getNumber('SU', 255)
-            VL = sd.getNumber('VL', 53)
-            VU = sd.getNumber('VU', 154)
-        elif camera_number == 2:
-            HL = sd.getNumber('HL', 19)
-            HU = sd.getNumber('HU', 41)
-            SL = sd.getNumber('SL', 237)
-            SU = sd.getNumber('SU', 255)
-            VL = sd.getNumber('VL', 67)
-            VU = sd.getNumber('VU', 135)
-        BallLower = (HL,SL,VL)
-        BallUpper = (HU,SU,VU)
-        print("HSV lower:%s HSV Upper:%s" % (BallLower, BallUpper))
-    except:
-        print("Unable to grab network table values, going to default values")
+def TrackTheBall(frame, sd, params=None): # does the opencv image proccessing
+
+    if params is None: # nothing listening for changes, e.g. replay
+        params = ballParams.read(sd)
+    BallLower = params['lower']
+    BallUpper = params['upper']
 
     if frame is None: # if there is no frame recieved
         sd.putNumber('GettingFrameData',False)
     else:
         sd.putNumber('GettingFrameData',True)
 
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV) # creates a binary image with only the parts within the bounds True
-    mask = cv2.inRange(hsv, BallLower, BallUpper) # cuts out all the useless stuff
-    mask = cv2.erode(mask, None, iterations = 2)
-    mask= cv2.dilate(mask, None, iterations = 2)
-    a, cnts, b = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)#finds pixels grouped together
+    pool = getPool(frame.shape[1], frame.shape[0]) # buffers for this video mode so nothing is allocated per frame
+    threshold = lambda image, hsvBuf, maskBuf, scratchBuf: ThresholdBall(pool, image, hsvBuf, maskBuf, scratchBuf, BallLower, BallUpper)
+    if pyramid.active(frame.shape[1]):
+        # no erode at the coarse level, two passes there would wipe out a far away ball
+        coarse = lambda image, hsvBuf, maskBuf, scratchBuf: ThresholdBall(pool, image, hsvBuf, maskBuf, scratchBuf, BallLower, BallUpper, False)
+        cnts = pyramid.findContours(frame, threshold, 100, pool, coarse) # 100 is well under the area of a radius 10 ball
+    else:
+        mask = threshold(frame, pool.hsv, pool.mask, pool.scratch)
+        np.copyto(pool.scratch, mask) # findContours may change its input and mask is used again
+        a, cnts, b = cv2.findContours(pool.scratch, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)#finds pixels grouped together
     sorted(cnts, key=cv2.contourArea, reverse=True)
     for j in range(0, len(cnts)):
         if len(cnts) > 0:
@@ -144,6 +172,7 @@ def TrackTheBall(frame, sd): # does the opencv image proccessing
                 cv2.circle(frame, center, 5, (0, 0, 255), -1)#draws the center of the circle onto the output image
                 sd.putNumber('Center'+str(j), center)
                 sd.putNumber('Radius'+str(j), radius)
+    pool.endFrame()
     return frame
 
 
@@ -169,6 +198,7 @@ if __name__ == "__main__":
     SmartDashBoardValues.setPersistent("SU")
     SmartDashBoardValues.setPersistent("VL")
     SmartDashBoardValues.setPersistent("VU")
+    ballParams.listen(SmartDashBoardValues)
 
     #Start camera
     print("Connecting to camera 1SSSS")
@@ -201,15 +231,20 @@ if __name__ == "__main__":
     CvSink = cs.getVideo()
     outputStream = cs.putVideo("Processed Frames", width, height)
 
-    #buffers to store img data
-    img = np.zeros(shape=(width,height,3), dtype=np.uint8)
+    #buffers to store img data, allocated once for this video mode
+    pool = getPool(width, height)
 
     # loop forever
     loopCount = 0
     while True:
-        GotFrame, img = CvSink.grabFrame(img)
+        GotFrame, img = CvSink.grabFrame(pool.bgr)
         if GotFrame  == 0:
             outputStream.notifyError(CvSink.getError())
             continue
-        img = TrackTheBall(img, SmartDashBoardValues)
+        pool.check('grabFrame', img, pool.bgr)
+        img = TrackTheBall(img, SmartDashBoardValues, ballParams.snapshot)
         outputStream.putFrame(img)
+        loopCount += 1
+        if loopCount%100 == 0:
+            SmartDashBoardValues.putNumber('allocFrames', pool.allocFrames)
+            log.publish(SmartDashBoardValues)
@@ -10,11 +10,17 @@ import json
 import time
 import sys
 import numpy as np
-from cscore import CameraServer, VideoSource
-# from networktables import NetworkTablesInstance
-from networktables import NetworkTables
+try:
+    from cscore import CameraServer, VideoSource
+    # from networktables import NetworkTablesInstance
+    from networktables import NetworkTables
+except ImportError: # not on the Pi, the pipeline can still be loaded by the offline tools
+    pass
 import cv2
 
+# a colorLookup.ColorLookup to threshold with a table instead of cvtColor and inRange, None uses cvtColor and inRange
+colorLookup = None
+
 
 def visionFun(image):
     try:
@@ -24,8 +30,11 @@ def visionFun(image):
         lower = np.array(lower, dtype="uint8")
         upper = np.array(upper, dtype="uint8")
 
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv, lower, upper)
+        if colorLookup is not None and colorLookup.setBounds(lower, upper):
+            mask = colorLookup.threshold(image, np.empty(image.shape[:2], dtype="uint8"))
+        else:
+            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+            mask = cv2.inRange(hsv, lower, upper)
 
         output = cv2.bitwise_and(image, image, mask=mask)
 
@@ -10,8 +10,11 @@ import json
 import time
 import sys
 
-from cscore import CameraServer, VideoSource, UsbCamera, MjpegServer
-from networktables import NetworkTablesInstance
+try:
+    from cscore import CameraServer, VideoSource, UsbCamera, MjpegServer
+    from networktables import NetworkTablesInstance
+except ImportError: # not on the Pi, the pipeline can still be loaded by the offline tools
+    pass
 import cv2
 import numpy
 import math
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import json
+import os
 import time
 import sys
 import numpy as np
@@ -9,6 +10,9 @@ import cv2
 from cscore import CameraServer, VideoSource, CvSource, VideoMode, CvSink, UsbCamera
 from networktables import NetworkTablesInstance
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from cameraScheduler import CameraScheduler
+
 configFile = "/boot/frc.json"
 
 class CameraConfig: pass
@@ -90,21 +94,6 @@ def readConfig():
 
     return True
 
-    """Start running the camera."""
-    def startCamera(config):
-        print("Starting camera '{}' on {}".format(config.name, config.path))
-        inst = CameraServer.getInstance()
-        camera = UsbCamera(config.name, config.path)
-        server = inst.startAutomaticCapture(camera=camera, return_server=True)
-
-        camera.setConfigJson(json.dumps(config.config))
-        camera.setConnectionStrategy(VideoSource.ConnectionStrategy.kKeepOpen)
-
-        if config.streamConfig is not None:
-            server.setConfigJson(json.dumps(config.streamConfig))
-
-        return camera
-
 # returns an array of the center coordinates
 def FindCenter(box):
     center = [0,0]
@@ -153,8 +142,8 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
                 box,box2 = box2,box
             sd.putNumberArray('tape1', centerL)
             sd.putNumberArray('tape2', centerR)
-            cv2.drawContours(img,[box],0,(0,0,255),2)
-            cv2.drawContours(img,[box2],0,(0,255,0),2)
+            cv2.drawContours(frame,[box],0,(0,0,255),2)
+            cv2.drawContours(frame,[box2],0,(0,255,0),2)
         else:
             # sd.putNumberArray('tape1', neg)
             # sd.putNumberArray('tape2', neg)
@@ -172,11 +161,11 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
             if center[0] < 80: # if there is only one tape detects wheter it is on the left or right
                 centerR = center
                 centerL = neg
-                cv2.drawContours(img,[box],0,(0,255,0),2)
+                cv2.drawContours(frame,[box],0,(0,255,0),2)
             else:
                 centerL = center
                 centerR = neg
-                cv2.drawContours(img,[box],0,(0,0,255),2)
+                cv2.drawContours(frame,[box],0,(0,0,255),2)
             sd.putNumberArray('tape1', centerL)
             sd.putNumberArray('tape2', centerR)
         else:
@@ -188,7 +177,7 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
     else: # when no tape is detected put the neg array everywhere
         sd.putNumberArray('tape1', neg)
         sd.putNumberArray('tape2', neg)
-    return img
+    return frame
 
 
 if __name__ == "__main__":
@@ -217,17 +206,28 @@ if __name__ == "__main__":
     Camera.setResolution(160,120)
     cs.addCamera(Camera)
     print("connected")
+
+    #Start second camera, facing the back of the robot
+    print("Connecting to camera 1")
+    Camera2 = UsbCamera('Cam 1', 1)
+    Camera2.setExposureManual(exp)
+    Camera2.setResolution(160,120)
+    cs.addCamera(Camera2)
+    print("connected")
+
     sp = SmartDashBoardValues
     sp.putNumber('ExpAuto', 0)
-    CvSink = cs.getVideo()
+    sp.putNumber('DriveDirection', 1)
+    CvSink = cs.getVideo(camera=Camera)
+    CvSink2 = cs.getVideo(camera=Camera2)
     outputStream = cs.putVideo("Processed Frames", 160,120)
-    # start cameras
-    cameras = []
-    cameras.append(startCamera(cameraConfigs[1]))
-
+    outputStream2 = cs.putVideo("Processed Frames 2", 160,120)
 
-    #buffers to store img data
-    img = np.zeros(shape=(160,120,3), dtype=np.uint8)
+    # both cameras run at once, the one facing DriveDirection (1 forward, -1 back) gets priority
+    scheduler = CameraScheduler(sp, 'DriveDirection')
+    front = scheduler.addCamera('Cam 0', CvSink, outputStream, TrackTheTape, sp, 160, 120, 30, 1)
+    back = scheduler.addCamera('Cam 1', CvSink2, outputStream2, TrackTheTape, sp.getSubTable('Cam 1'), 160, 120, 30, -1)
+    scheduler.start()
     ExpStatus = sp.getNumber('ExpAuto', 0)
 
     # loop forever
@@ -236,24 +236,15 @@ if __name__ == "__main__":
         if ExpAuto == 0:
             if ExpStatus == 1:
                 Camera.setExposureManual(exp)
+                front.processing = True
                 ExpStatus = 0
-            GotFrame, img = CvSink.grabFrame(img)
-            if GotFrame  == 0:
-                outputStream.notifyError(CvSink.getError())
-                continue
-            img = TrackTheTape(img, SmartDashBoardValues)
 
         elif ExpAuto == 1:
                 if ExpStatus == 0:
                     Camera.setExposureAuto()
+                    front.processing = False
                     ExpStatus = 1
-                neg = [-1,-1] # just a negative array to use when no tape is detected
-                sp.putNumberArray('tape1', neg)
-                sp.putNumberArray('tape2', neg)
-                GotFrame, img = CvSink.grabFrame(img)
-                if GotFrame  == 0:
-                    outputStream.notifyError(CvSink.getError())
-                    continue
-
-        else:
-            print("")
+                    neg = [-1,-1] # just a negative array to use when no tape is detected
+                    sp.putNumberArray('tape1', neg)
+                    sp.putNumberArray('tape2', neg)
+        time.sleep(0.1)
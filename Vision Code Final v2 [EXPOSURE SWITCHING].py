@@ -9,6 +9,10 @@ import cv2
 from cscore import CameraServer, VideoSource, CvSource, VideoMode, CvSink, UsbCamera
 from networktables import NetworkTablesInstance
 
+from frameGovernor import FrameGovernor
+from paramCache import ParameterCache
+from visionLog import log
+
 configFile = "/boot/frc.json"
 
 class CameraConfig: pass
@@ -16,6 +20,8 @@ class CameraConfig: pass
 team = 7539
 server = False
 cameraConfigs = []
+#Runs capture, processing and streaming as asyncio tasks instead of the polling loop below
+useAsyncio = False
 
 """Report parse error."""
 def parseError(str):
@@ -138,7 +144,6 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
     neg = [-1,-1] # just a negative array to use when no tape is detected
     centerL = neg
     centerR = neg
-    Exp = sd.getNumber('ExpAuto', 0)
     TapeLower= (65,75,75) # the lower bounds of the hsv
     TapeUpper = (80,255,255) # the upper bounds of hsv values
     if frame is None: # if there is no frame recieved
@@ -174,8 +179,8 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
                 box,box2 = box2,box
             tape1 = centerL
             tape2 = centerR
-            cv2.drawContours(img,[box],0,(0,0,255),2)
-            cv2.drawContours(img,[box2],0,(0,255,0),2)
+            cv2.drawContours(frame,[box],0,(0,0,255),2)
+            cv2.drawContours(frame,[box2],0,(0,255,0),2)
         else:
             # sd.putNumberArray('tape1', neg)
             # sd.putNumberArray('tape2', neg)
@@ -193,11 +198,11 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
             if center[0] < 80: # if there is only one tape detects wheter it is on the left or right
                 centerR = center
                 centerL = neg
-                cv2.drawContours(img,[box],0,(0,255,0),2)
+                cv2.drawContours(frame,[box],0,(0,255,0),2)
             else:
                 centerL = center
                 centerR = neg
-                cv2.drawContours(img,[box],0,(0,0,255),2)
+                cv2.drawContours(frame,[box],0,(0,0,255),2)
             tape1 = centerL
             tape2 = centerR
         else:
@@ -211,7 +216,7 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
         tape2 = neg
     sd.putNumberArray('tape1', centerL)
     sd.putNumberArray('tape2', centerR)
-    return img
+    return frame
 
 
 if __name__ == "__main__":
@@ -248,12 +253,31 @@ if __name__ == "__main__":
     cameras = []
     cameras.append(startCamera(cameraConfigs[1]))
     #buffers to store img data
-    img = np.zeros(shape=(160,120,3), dtype=np.uint8)
+    img = np.zeros(shape=(120,160,3), dtype=np.uint8)
+
+    if useAsyncio:
+        from asyncRuntime import VisionRuntime
+        VisionRuntime(Camera, CvSink, outputStream, SmartDashBoardValues, TrackTheTape, 160, 120, exp).run()
+        sys.exit(0)
+
     ExpStatus = sp.getNumber('ExpAuto', 0)
+    # keeps the loop at TargetFPS, or AlignFPS while the robot is aligning
+    sp.putNumber('TargetFPS', 30)
+    sp.putNumber('AlignFPS', 60)
+    governor = FrameGovernor(30, 60)
+    # the controls are updated by entry listeners instead of read every loop
+    controls = ParameterCache({'ExpAuto': 0, 'TargetFPS': 30, 'AlignFPS': 60, 'Aligning': False}).listen(sp)
 
     # loop forever
+    loopCount = 0
     while True:
-        ExpAuto = sp.getNumber('ExpAuto', 0)
+        control = controls.snapshot
+        governor.setTarget(control['TargetFPS'])
+        if control['Aligning']:
+            governor.boost(control['AlignFPS'])
+        else:
+            governor.unboost()
+        ExpAuto = control['ExpAuto']
         if ExpAuto == 0:
             if ExpStatus == 1:
                 Camera.setExposureManual(exp)
@@ -277,6 +301,11 @@ if __name__ == "__main__":
                     continue
 
         else:
-            print("")
+            log.warning('expAuto', "ExpAuto should be 0 or 1, not %s", ExpAuto)
         outputStream.putFrame(img)
-        time.sleep(10)
+        loopCount += 1
+        if loopCount%10 == 0:
+            sp.putNumber('visionFPS', governor.achievedFps)
+            sp.putNumber('visionTargetFPS', governor.currentTarget())
+            log.publish(sp)
+        governor.wait()
@@ -11,6 +11,10 @@ import cv2
 from cscore import CameraServer, VideoSource, CvSource, VideoMode, CvSink, UsbCamera, CameraServer, MjpegServer
 from networktables import NetworkTablesInstance
 
+from tapeGeometry import boxGeometry
+from paramCache import ParameterCache
+from visionLog import log
+
 configFile = "/boot/frc.json"
 
 class CameraConfig: pass
@@ -93,40 +97,6 @@ def readConfig():
 
     return True
 
-# returns an array of the center coordinates
-def FindCenter(box):
-    center = [0,0]
-    for i in box:
-        center[0] += i[0]
-        center[1] += i[1]
-    center[0] = center[0]/4
-    center[1] = center[1]/4
-    return center
-
-def findDistance(c1,c2):
-    return math.sqrt((math.pow(c1[0]-c2[0],2))+(math.pow(c1[1]-c2[1],2)))
-
-def findSlope(box):
-
-    if(findDistance(box[0],box[1])>findDistance(box[1],box[2])):
-        if box[0][0]-box[1][0]==0:
-            return 1
-        else:
-            return (box[0][1]-box[1][1])/(box[0][0]-box[1][0])
-    else:
-        if box[1][0]-box[2][0]==0:
-            return 1
-        else:
-            return (box[1][1]-box[2][1])/(box[1][0]-box[2][0])
-
-def findRatio(box):
-    long = findDistance(box[2],box[3])
-    short = findDistance(box[1],box[2])
-    ratio = long/short
-    if abs(ratio)<1:
-        ratio = 1/ratio 
-    return ratio
-
 def PrintBox(box):
     for i in box :
         print(i[0])
@@ -145,28 +115,25 @@ def getTargetDistance(width):
     distance = ((5.125) / (math.tan(radian)))
     return distance
 
+# the HSV bound tuples, made once each time the bounds change
+def TapeBounds(values):
+    TapeLower = (values['HL'], values['SL'], values['VL'])
+    TapeUpper = (values['HU'], values['SU'], values['VU'])
+    log.info('hsvBounds', "HSV lower:%s HSV Upper:%s", TapeLower, TapeUpper)
+    return {'lower': TapeLower, 'upper': TapeUpper}
+
+#HSV bounds from the dashboard, kept up to date by entry listeners once main starts listening
+# tapeParams = ParameterCache({'HL': 0, 'HU': 180, 'SL': 0, 'SU': 255, 'VL': 40, 'VU': 255}, TapeBounds)
+tapeParams = ParameterCache({'HL': 66, 'HU': 114, 'SL': 64, 'SU': 117, 'VL': 127, 'VU': 179}, TapeBounds)
+
 # def ScaleHeight(height):
  
-def TrackTheTape(frame, sd): # does the opencv image proccessing
+def TrackTheTape(frame, sd, params=None): # does the opencv image proccessing
 
-    try:
-        # HL = sd.getNumber('HL', 0)
-        # HU = sd.getNumber('HU', 180)
-        # SL = sd.getNumber('SL', 0)
-        # SU = sd.getNumber('SU', 255)
-        # VL = sd.getNumber('VL', 40)
-        # VU = sd.getNumber('VU', 255)
-        HL = sd.getNumber('HL', 66)
-        HU = sd.getNumber('HU', 114)
-        SL = sd.getNumber('SL', 64)
-        SU = sd.getNumber('SU', 117)
-        VL = sd.getNumber('VL', 127)
-        VU = sd.getNumber('VU', 179)
-        TapeLower = (HL,SL,VL)
-        TapeUpper = (HU,SU,VU)
-        print("HSV lower:%s HSV Upper:%s" % (TapeLower, TapeUpper))
-    except:
-        print("Unable to grab network table values, going to default values")
+    if params is None: # nothing listening for changes, e.g. replay
+        params = tapeParams.read(sd)
+    TapeLower = params['lower']
+    TapeUpper = params['upper']
 
     if frame is None: # if there is no frame recieved
         sd.putNumber('GettingFrameData',False)
@@ -197,24 +164,18 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
         sorted(cnts, key=cv2.contourArea, reverse=True) #sorts the array with all the contours so those with the largest area are first
         c = cnts[0] # c is the largest contour
         d = cnts[1] # d is the second largest contour
-        rect = cv2.minAreaRect(c)
-        boxL = cv2.boxPoints(rect)
-        boxL = np.int0(boxL)
         # for these refer to https://docs.opencv.org/3.1.0/dd/d49/tutorial_py_contour_features.html
-        rect2 = cv2.minAreaRect(d)
-        boxR = cv2.boxPoints(rect2)
-        boxR = np.int0(boxR)
-        # if len(cnts) > 1:
-        #     centerL = FindCenter(boxL)
-        #     centerR = FindCenter(boxR)
-        if findSlope(boxL)<findSlope(boxR): # finds out which tape is on the left and right by comparing slopes
+        boxes = np.int0([cv2.boxPoints(cv2.minAreaRect(c)), cv2.boxPoints(cv2.minAreaRect(d))])
+        centers, tilts, ratios, sides = boxGeometry(boxes) # both boxes at once
+        boxL, boxR = boxes
+        centerL, centerR = centers.tolist()
+        if tilts[0]>tilts[1]: # the "/" tape (negative tilt) is the left one, like tapePairing in Vision Code.py
             centerL,centerR = centerR,centerL
             boxL,boxR = boxR,boxL
         avgArea = (cv2.contourArea(c) + cv2.contourArea(d))/2
         tape1 = centerL
         tape2 = centerR
-        centerN[0] = (centerR[0]+centerL[0])/2
-        centerN[1] = (centerR[1]+centerL[1])/2
+        centerN = centers.mean(axis=0).tolist()
         cv2.drawContours(img,[boxL],0,(0,0,255),2)
         cv2.drawContours(img,[boxR],0,(0,255,0),2)
         # else:
@@ -231,8 +192,9 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
         boxR = None
         # for these refer to https://docs.opencv.org/3.1.0/dd/d49/tutorial_py_contour_features.html
         # if len(cnts) >= 1:
-        center = FindCenter(box)
-        if findSlope(box)<=0: # if there is only one tape detects wheter it is on the left or right using the value of its slope
+        centers, tilts, ratios, sides = boxGeometry(box)
+        center = centers[0].tolist()
+        if tilts[0]>=0: # a "\" tape on its own is the right one of a target
             centerR = center
             centerN = centerR
             centerL = neg
@@ -292,6 +254,7 @@ if __name__ == "__main__":
     SmartDashBoardValues.setPersistent("SU")
     SmartDashBoardValues.setPersistent("VL")
     SmartDashBoardValues.setPersistent("VU")
+    tapeParams.listen(SmartDashBoardValues)
 
     #Start first camera
     print("Connecting to camera 1SSSS")
@@ -335,7 +298,7 @@ if __name__ == "__main__":
     outputStream = cs.putVideo("Processed Frames", width, height)
 
     #buffers to store img data
-    img = np.zeros(shape=(width,height,3), dtype=np.uint8)
+    img = np.zeros(shape=(height,width,3), dtype=np.uint8)
 
     # loop forever
     loopCount = 0
@@ -344,5 +307,5 @@ if __name__ == "__main__":
         if GotFrame  == 0:
             outputStream.notifyError(CvSink.getError())
             continue
-        img = TrackTheTape(img, SmartDashBoardValues)
+        img = TrackTheTape(img, SmartDashBoardValues, tapeParams.snapshot)
         outputStream.putFrame(img)
@@ -8,8 +8,32 @@ import numpy as np
 import math
 import cv2
 
-from cscore import CameraServer, VideoSource, CvSource, VideoMode, CvSink, UsbCamera, CameraServer, MjpegServer
-from networktables import NetworkTablesInstance
+try:
+    from cscore import CameraServer, VideoSource, CvSource, VideoMode, CvSink, UsbCamera, CameraServer, MjpegServer
+    from networktables import NetworkTablesInstance
+except ImportError: # not on the Pi, the detectors can still be loaded by the offline tools
+    pass
+
+from frameGrabber import FrameGrabber
+from tapeWorkers import TapeWorkerPool
+from framePool import getPool
+from latencyStats import LatencyHistogram
+from stageTimer import StageTimer
+from frameRecording import FrameRecorder
+from roiTracker import RoiTracker
+from contourFeatures import buildFeatureTable, topK, boxOf, boxesFor
+from tapePairing import findTargets, leansRight
+from colorLookup import ColorLookup
+from pyramidDetect import PyramidDetector
+from targetPose import PoseEstimator
+from tapeGeometry import pointDistances
+from distanceTable import DistanceCalibration
+from targetTracker import TargetTracker, DetectionThrottle
+from sceneCache import SceneCache
+from visionResult import ResultTable
+from changeOnlyTable import ChangeOnlyTable
+from paramCache import ParameterCache
+from visionLog import log
 
 configFile = "/boot/frc.json"
 
@@ -18,6 +42,34 @@ class CameraConfig: pass
 team = 7539
 server = False
 cameraConfigs = []
+#Number of worker processes to run TrackTheTape in. 0 runs it in this process on the main thread
+numWorkers = 0
+#Times each stage of TrackTheTape, published to VisionDiagnostics and dumped on SIGUSR1
+stageTimes = StageTimer(enabled=False)
+#File to save the raw camera frames to for replay.py, e.g. "/home/pi/match.frc". None turns recording off
+recordFile = None
+#Once the tape is found only the area around it is searched, until it has been missed maxMisses frames in a row. The whole frame is still searched every fullEvery frames for the other targets
+roi = RoiTracker(maxMisses=4, fullEvery=5, enabled=True)
+#Thresholds with a table made from the HSV bounds instead of cvtColor and inRange, e.g. ColorLookup('full') or ColorLookup('quantized', bits=5). None uses cvtColor and inRange
+colorLookup = None
+#Frames wider than about twice coarseWidth are searched for tape at coarseWidth and only the crops around what was found are searched at full resolution
+pyramid = PyramidDetector(coarseWidth=160, enabled=True)
+#Fits the corners of the target nearest the middle to the 2019 target with solvePnP for its distance, yaw and skew. fov is the camera's horizontal field of view in degrees
+pose = PoseEstimator(fov=60, enabled=True)
+#Width to distance table measured at the field for the camera and resolution in use, set up in main. Calibrate with numWorkers = 0 so the samples all end up in this process
+distanceCalibration = None
+#File the distance tables are kept in. Not next to configFile, /boot is mounted read only on the Pi
+distanceTableFile = "/home/pi/distanceTables.json"
+#Smooths the target nearest the middle and predicts where it is for up to maxPredict seconds after it was last seen
+tracker = TargetTracker(maxPredict=0.3, enabled=True)
+#When detecting takes more than loadLimit of the time between frames only every Nth frame, up to maxEvery, is detected and the rest get the tracker's prediction
+throttle = DetectionThrottle(maxEvery=4, loadLimit=0.8, enabled=True)
+#Reuses the last result and overlay while the camera sees the same scene, detecting at least every maxAge seconds
+sceneCache = SceneCache(threshold=6, maxAge=1.0, enabled=True)
+#Puts tape1, tape2, centerN etc. under their own keys as well as in the packed visionResult array. False sends them only in visionResult
+separateKeys = True
+#Only puts a value when it has moved by more than its deadband, with everything held back and a visionHeartbeat sent every keepalive seconds. None puts every value every frame
+deadbands = {'tape1': 0.5, 'tape2': 0.5, 'centerN': 0.5, 'avgArea': 2, 'targets': 0.5, 'targetDistance': 0.5, 'targetYaw': 0.2, 'targetSkew': 1.0, 'widthDistance': 0.5}
 
 """Report parse error."""
 def parseError(str):
@@ -93,33 +145,6 @@ def readConfig():
 
     return True
 
-# returns an array of the center coordinates
-def FindCenter(box):
-    center = [0,0]
-    for i in box:
-        center[0] += i[0]
-        center[1] += i[1]
-    center[0] = center[0]/4
-    center[1] = center[1]/4
-    return center
-
-def findDistance(c1,c2):
-    return math.sqrt((math.pow(c1[0]-c2[0],2))+(math.pow(c1[1]-c2[1],2)))
-
-def findSlope(box):
-    if(findDistance(box[0],box[1])>findDistance(box[1],box[2])):
-        return (box[0][1]-box[1][1])/(box[0][0]-box[1][0])
-    else:
-        return (box[1][1]-box[2][1])/(box[1][0]-box[2][0])
-
-def findRatio(box):
-    long = findDistance(box[2],box[3])
-    short = findDistance(box[1],box[2])
-    ratio = long/short
-    if abs(ratio)<1:
-        ratio = 1/ratio 
-    return ratio
-
 def PrintBox(box):
     for i in box :
         print(i[0])
@@ -134,13 +159,57 @@ def getImageSizeInDeg(width):
     return (nPixels * DEG_PER_PIXEL)
 
 def getTargetDistance(width):
+    if distanceCalibration is not None and distanceCalibration.table is not None:
+        return distanceCalibration.lookup(width)
     radian = math.radians(getImageSizeInDeg(width))
     distance = ((5.125) / (math.tan(radian)))
     return distance
 
+# puts the capture time of the frame the tape results came from and how long it took
+# to get them out. The latency is measured from when grabFrame returned the frame
+def PutFrameTiming(sd, frameTime, grabbedAt, latency):
+    latencyMs = (time.monotonic() - grabbedAt)*1000
+    sd.putNumber('captureTime', frameTime) # cscore frame time in microseconds
+    sd.putNumber('latency', latencyMs)
+    latency.add(latencyMs)
+
+# fills maskBuf with the parts of image inside the HSV bounds and returns it
+def ThresholdTape(pool, image, hsvBuf, maskBuf, lower, upper):
+    if colorLookup is not None and colorLookup.setBounds(lower, upper): # False until the first table is built
+        return colorLookup.threshold(image, maskBuf)
+    hsv = pool.check('cvtColor', cv2.cvtColor(image, cv2.COLOR_BGR2HSV, hsvBuf), hsvBuf) # creates a binary image with only the parts within the bounds True
+    return pool.check('inRange', cv2.inRange(hsv, lower, upper, maskBuf), maskBuf) # cuts out all the useless shit
+
+# puts where the tracker thinks the target is for a frame that is not being detected
+def PredictTheTape(frame, sd, grabbedAt=None):
+    predicted = tracker.predict(time.monotonic() if grabbedAt is None else grabbedAt)
+    if predicted is None:
+        neg = [-1,-1]
+        tape1, tape2, centerN, avgArea = neg, neg, neg, -1
+    else:
+        tape1, tape2, centerN, avgArea = predicted
+        cv2.circle(frame, (int(centerN[0]), int(centerN[1])), 3, (255,0,255), 1)
+    sd.putBoolean('targetMeasured', False)
+    sd.putNumberArray('tape1', tape1)
+    sd.putNumberArray('tape2', tape2)
+    sd.putNumberArray('centerN', centerN)
+    sd.putNumber('avgArea', avgArea)
+    return frame
+
+# the HSV bound tuples, made once each time the bounds change
+def TapeBounds(values):
+    TapeLower = (values['HL'], values['SL'], values['VL'])
+    TapeUpper = (values['HU'], values['SU'], values['VU'])
+    log.info('hsvBounds', "HSV lower:%s HSV Upper:%s", TapeLower, TapeUpper)
+    return {'lower': TapeLower, 'upper': TapeUpper}
+
+#HSV bounds from the dashboard, kept up to date by entry listeners once main starts listening
+tapeParams = ParameterCache({'HL': 0, 'HU': 57, 'SL': 0, 'SU': 167, 'VL': 94, 'VU': 255}, TapeBounds)
+
 # def ScaleHeight(height):
  
-def TrackTheTape(frame, sd): # does the opencv image proccessing
+def TrackTheTape(frame, sd, params=None, grabbedAt=None): # does the opencv image proccessing, grabbedAt is the time.monotonic() the frame was grabbed, or its recorded time in seconds when replaying
+    stageTimes.start()
 
     # In bright lights
     TapeLower= (66,105,70) # the lower bounds of the hsv
@@ -150,115 +219,137 @@ def TrackTheTape(frame, sd): # does the opencv image proccessing
     TapeLower= (50,70,135) # the lower bounds of the hsv
     TapeUpper = (180,255,255) # the upper bounds of hsv values
 
-    try:
-        HL = sd.getNumber('HL', 0)
-        HU = sd.getNumber('HU', 57)
-        SL = sd.getNumber('SL', 0)
-        SU = sd.getNumber('SU', 167)
-        VL = sd.getNumber('VL', 94)
-        VU = sd.getNumber('VU', 255)
-        TapeLower = (HL,SL,VL)
-        TapeUpper = (HU,SU,VU)
-        print("HSV lower:%s HSV Upper:%s" % (TapeLower, TapeUpper))
-    except:
-        print("Unable to grab network table values, going to default values")
+    if params is None: # nothing listening for changes, e.g. replay or a worker process
+        params = tapeParams.read(sd)
+    TapeLower = params['lower']
+    TapeUpper = params['upper']
+    stageTimes.lap('params')
 
     if frame is None: # if there is no frame recieved
         sd.putNumber('GettingFrameData',False)
     else:
         sd.putNumber('GettingFrameData',True)
 
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV) # creates a binary image with only the parts within the bounds True
-
-    mask = cv2.inRange(hsv, TapeLower, TapeUpper) # cuts out all the useless shit
-    # mask = cv2.erode(mask, None, iterations = 2)
-    # mask= cv2.dilate(mask, None, iterations = 2)
-
+    pool = getPool(frame.shape[1], frame.shape[0]) # buffers for this video mode so nothing is allocated per frame
+    window = roi.window(frame.shape[1], frame.shape[0]) # where to look, None if we don't know where the tape is
+    if window is None:
+        x0, y0, x1, y1 = 0, 0, frame.shape[1], frame.shape[0]
+    else:
+        x0, y0, x1, y1 = window
     minArea = 30 # minimum area of either of the tapes
-    a, cnts , b= cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    if window is None and pyramid.active(frame.shape[1]): # a big frame with no idea where the tape is
+        cnts = pyramid.findContours(frame, lambda image, hsvBuf, maskBuf, scratchBuf: ThresholdTape(pool, image, hsvBuf, maskBuf, TapeLower, TapeUpper), minArea, pool)
+        stageTimes.lap('pyramid')
+    else:
+        mask = ThresholdTape(pool, frame[y0:y1, x0:x1], pool.hsv[y0:y1, x0:x1], pool.mask[y0:y1, x0:x1], TapeLower, TapeUpper)
+        stageTimes.lap('threshold')
+        # mask = cv2.erode(mask, None, iterations = 2)
+        # mask= cv2.dilate(mask, None, iterations = 2)
+
+        a, cnts , b= cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE, offset=(x0, y0)) # offset puts the contours back in full frame coordinates
+        stageTimes.lap('findContours')
     center = None
     neg = [-1,-1] # just a negative array to use when no tape is detected
     centerN = neg
     centerL = neg
     centerR = neg
     avgArea = 0
-    cnts2 = []
-    for cur in cnts:
-        if cv2.contourArea(cur) >= minArea:
-            cnts2.append(cur)
-    cnts = cnts2
-
-    if len(cnts) > 1: # if there is more than 1 contour
-        sorted(cnts, key=cv2.contourArea, reverse=True) #sorts the array with all the contours so those with the largest area are first
-        c = cnts[0] # c is the largest contour
-        d = cnts[1] # d is the second largest contour
-        rect = cv2.minAreaRect(c)
-        boxL = cv2.boxPoints(rect)
-        boxL = np.int0(boxL)
+    targetPose = None # (distance, yaw, skew) of the target nearest the middle
+    widthDistance = -1 # from the calibrated table and the pixels between the tape centers
+    features = buildFeatureTable(cnts, minArea) # area and rotated rect of every contour big enough to be tape
+    stageTimes.lap('features')
+    targets = findTargets(features, frame.shape[1]) # every "/ \" pair, the one nearest the middle first
+    stageTimes.lap('pairing')
+
+    if len(targets) > 0: # if there is at least one full target
+        c = features[targets[0]['left']] # c is the left tape of the target nearest the middle
+        d = features[targets[0]['right']] # d is its right tape
+        centerL = [c['cx'], c['cy']]
+        centerR = [d['cx'], d['cy']]
+        avgArea = targets[0]['area']
+        tape1 = centerL
+        tape2 = centerR
+        centerN = [targets[0]['cx'], targets[0]['cy']]
+        stageTimes.lap('geometry')
         # for these refer to https://docs.opencv.org/3.1.0/dd/d49/tutorial_py_contour_features.html
-        rect2 = cv2.minAreaRect(d)
-        boxR = cv2.boxPoints(rect2)
-        boxR = np.int0(boxR)
-        if len(cnts) > 1:
-            centerL = FindCenter(boxL)
-            centerR = FindCenter(boxR)
-            if findSlope(boxL)<findSlope(boxR): # finds out which tape is on the left and right by comparing x coordinates
-                centerL,centerR = centerR,centerL
-                boxL,boxR = boxR,boxL
-            avgArea = (cv2.contourArea(c) + cv2.contourArea(d))/2
-            tape1 = centerL
-            tape2 = centerR
-            centerN[0] = (centerR[0]+centerL[0])/2
-            centerN[1] = (centerR[1]+centerL[1])/2
-            cv2.drawContours(img,[boxL],0,(0,0,255),2)
-            cv2.drawContours(img,[boxR],0,(0,255,0),2)
+        boxL = boxOf(c)
+        boxR = boxOf(d)
+        roi.found([boxL, boxR], avgArea)
+        targetPose = pose.solve(boxesFor(features[[targets[0]['left'], targets[0]['right']]]), frame.shape[1], frame.shape[0])
+        stageTimes.lap('pose')
+        if distanceCalibration is not None:
+            width = pointDistances(centerL, centerR)
+            distanceCalibration.update(width)
+            if distanceCalibration.table is not None:
+                widthDistance = distanceCalibration.lookup(width)
+        if len(targets) > 1: # the other targets in view in yellow
+            boxes = np.int0(boxesFor(features)) # every box in one go
+            for t in targets[1:]:
+                cv2.drawContours(frame,[boxes[t['left']], boxes[t['right']]],-1,(0,255,255),1)
+        cv2.drawContours(frame,[boxL],0,(0,0,255),2)
+        cv2.drawContours(frame,[boxR],0,(0,255,0),2)
+        stageTimes.lap('drawContours')
+    elif len(features) > 0: # if there is only tape without a partner
+        pose.reset() # the next target found could be a different one
+        c = topK(features, 1)[0] # the largest one
+        center = [c['cx'], c['cy']]
+        avgArea = c['area']
+        stageTimes.lap('geometry')
+        box = boxOf(c)
+        if not leansRight(c): # a "\" tape is the right one of a target
+            centerR = center
+            centerN = centerR
+            centerL = neg
+            cv2.drawContours(frame,[box],0,(0,255,0),2)
         else:
-            # sd.putNumberArray('tape1', neg)
-            # sd.putNumberArray('tape2', neg)
-            tape1 = neg
-            tape2 = neg
-            avgArea = -1
-    elif len(cnts) == 1: # if there is 1 contour
-        sorted(cnts, key=cv2.contourArea, reverse=True) #sorts the array with all the contours so those with the largest area are first
-        c = cnts[0] # c is the largest contour
-        rect = cv2.minAreaRect(c)
-        boxL = cv2.boxPoints(rect)
-        boxL = np.int0(boxL)
-        # for these refer to https://docs.opencv.org/3.1.0/dd/d49/tutorial_py_contour_features.html
-        if len(cnts) >= 1:
-            center = FindCenter(boxL)
-            if center[0] < 80: # if there is only one tape detects wheter it is on the left or right
-                centerR = center
-                centerN = centerR
-                centerL = neg
-                cv2.drawContours(img,[boxL],0,(0,255,0),2)
-            else:
-                centerL = center
-                centerN = centerL
-                centerR = neg
-                cv2.drawContours(img,[boxL],0,(0,0,255),2)
-            avgArea = cv2.contourArea(c)
-            tape1 = centerL
-            tape2 = centerR
-        else:
-            # sd.putNumberArray('tape1', neg)
-            # sd.putNumberArray('tape2', neg)
-            tape1 = neg
-            tape2 = neg
-            avgArea = -1
+            centerL = center
+            centerN = centerL
+            centerR = neg
+            cv2.drawContours(frame,[box],0,(0,0,255),2)
+        stageTimes.lap('drawContours')
+        roi.missed() # one tape alone would shrink the window so its partner could never come back into it
+        tape1 = centerL
+        tape2 = centerR
 
     else: # when no tape is detected put the neg array everywhere
+        roi.missed()
+        pose.reset()
         tape1 = neg
         tape2 = neg
         centerN = neg
         avgArea = -1
 
+    now = time.monotonic() if grabbedAt is None else grabbedAt # when the frame was taken, not when we got round to it
+    measured = len(features) > 0
+    if len(targets) > 0:
+        tape1, tape2, centerN, avgArea = tracker.update(now, tape1, tape2, avgArea)
+    else: # keep the target going through a frame or two where it is lost
+        predicted = tracker.predict(now)
+        if predicted is not None:
+            tape1, tape2, centerN, avgArea = predicted
+            measured = False
+
+    stageTimes.lap('misc')
+    sd.putBoolean('targetMeasured', measured) # False when the values are the tracker's prediction
     sd.putNumberArray('tape1', tape1)
     sd.putNumberArray('tape2', tape2)
     sd.putNumberArray('centerN', centerN)
     sd.putNumber('avgArea', avgArea)
+    if targetPose is None: # -1 distance when there is no full target
+        targetPose = (-1, 0, 0)
+    sd.putNumber('targetDistance', targetPose[0]) # inches along the floor
+    sd.putNumber('targetYaw', targetPose[1]) # degrees, positive when the target is to the right
+    sd.putNumber('targetSkew', targetPose[2]) # degrees the target is turned away from facing the camera
+    sd.putNumber('widthDistance', widthDistance) # inches, -1 without a full target or a calibrated table
+    # every target found as [cx, cy, avgArea, ...], nearest the middle first, so the robot can pick another one.
+    # Only a whole frame search sees them all, so these are from the last one, at most roi.fullEvery frames old
+    if window is None:
+        sd.putNumber('targetCount', len(targets))
+        sd.putNumberArray('targets', np.column_stack((targets['cx'], targets['cy'], targets['area'])).ravel().tolist())
+    stageTimes.lap('putNumber')
     # print ("tape1 = %d tape2 = %d"%(tape1[0],tape2[0]))
-    return img
+    pool.endFrame()
+    return frame
 
 
 if __name__ == "__main__":
@@ -276,6 +367,8 @@ if __name__ == "__main__":
     ntinst.startClientTeam(7539)
 
     SmartDashBoardValues = ntinst.getTable('SmartDashboard')
+    publisher = ChangeOnlyTable(SmartDashBoardValues, deadbands, keepalive=1.0) if deadbands is not None else None
+    results = ResultTable(publisher or SmartDashBoardValues, flush=ntinst.flush, separate=separateKeys) # one packed array per frame, flushed straight away
     # HL = SmartDashBoardValues.putNumber('HL', 66)
     # HU = SmartDashBoardValues.putNumber('HU', 141)
     # SL = SmartDashBoardValues.putNumber('SL', 105)
@@ -289,6 +382,7 @@ if __name__ == "__main__":
     SmartDashBoardValues.setPersistent("SU")
     SmartDashBoardValues.setPersistent("VL")
     SmartDashBoardValues.setPersistent("VU")
+    tapeParams.listen(SmartDashBoardValues)
 
     #Start first camera
     print("Connecting to camera 0")
@@ -298,6 +392,7 @@ if __name__ == "__main__":
     #exp = 2
     #Camera.setExposureManual(exp)
     Camera.setResolution(160,120)
+    distanceCalibration = DistanceCalibration(distanceTableFile, 'Cam 0', 160, 120).listen(SmartDashBoardValues)
     cs.addCamera(Camera)
     #SmartDashBoardValues.putNumber('ExpAuto', 0)
 
@@ -312,44 +407,95 @@ if __name__ == "__main__":
 
     CvSink = cs.getVideo()
     outputStream = cs.putVideo("Processed Frames", 160,120)
+    latency = LatencyHistogram()
+    diagnostics = SmartDashBoardValues.getSubTable('VisionDiagnostics')
+    stageTimes.dumpOnSignal()
+
+    if numWorkers > 0:
+        # frames are grabbed straight into shared memory and fanned out to the workers
+        tracker.enabled = False # each worker would only see some of the frames
+        pool = TapeWorkerPool(TrackTheTape, 160, 120, numWorkers)
+        captures = {} # (frameTime, grabbedAt) for every frame still with the workers
+        loopCount = 0
+        while True:
+            for seq, slot, img, puts in pool.finished(): # results come back in frame order
+                results.begin()
+                for method, key, value in puts:
+                    getattr(results, method)(key, value)
+                for lost in [s for s in captures if s < seq]: # frames the pool skipped
+                    del captures[lost]
+                frameTime, grabbedAt = captures.pop(seq)
+                results.publish(seq, frameTime)
+                if publisher is not None:
+                    publisher.tick()
+                PutFrameTiming(SmartDashBoardValues, frameTime, grabbedAt, latency)
+                outputStream.putFrame(img)
+                pool.release(slot)
+                loopCount += 1
+                if loopCount%100 == 0:
+                    latency.publish(SmartDashBoardValues)
+                    if publisher is not None:
+                        publisher.publishStats()
+                    log.publish(SmartDashBoardValues)
+                    SmartDashBoardValues.putNumber('workerSkipped', pool.skipped)
+                    SmartDashBoardValues.putNumber('workerRestarts', pool.restarts)
+            slot = pool.freeSlot()
+            if slot is None:
+                continue
+            buf = pool.frames[slot]
+            GotFrame, img = CvSink.grabFrame(buf)
+            grabbedAt = time.monotonic()
+            if GotFrame  == 0:
+                outputStream.notifyError(CvSink.getError())
+                pool.release(slot)
+                continue
+            if img is not buf:
+                np.copyto(buf, img)
+            seq = pool.submit(slot, dict(tapeParams.values)) # the workers read these from their table
+            captures[seq] = (GotFrame, grabbedAt)
+
+    # capture runs on its own thread, this loop only ever sees the newest frame
+    grabber = FrameGrabber(CvSink, 160, 120).start()
+    recorder = FrameRecorder(recordFile, 160, 120) if recordFile else None
 
-    #buffers to store img data
-    img = np.zeros(shape=(160,120,3), dtype=np.uint8)
-    #ExpStatus = SmartDashBoardValues.getNumber('ExpAuto', 0)
     # loop forever
     loopCount = 0
-    #while True:
-        # output = ""
-        # ExpAuto = SmartDashBoardValues.getNumber('ExpAuto', 0)
-        #
-        # if ExpAuto == 0:
-        #     if ExpStatus == 1:
-        #         Camera.setExposureManual(exp)
-        #         ExpStatus = 0
-        #     GotFrame, img = CvSink.grabFrame(img)
-        #     if GotFrame  == 0:
-        #         outputStream.notifyError(CvSink.getError())
-        #         continue
-        #     img = TrackTheTape(img, SmartDashBoardValues)
-        #
-        # elif ExpAuto == 1:
-        #         if ExpStatus == 0:
-        #             Camera.setExposureAuto()
-        #             ExpStatus = 1
-        #         neg = [-1,-1] # just a negative array to use when no tape is detected
-        #         SmartDashBoardValues.putNumberArray('tape1', neg)
-        #         SmartDashBoardValues.putNumberArray('tape2', neg)
-        #         GotFrame, img = CvSink.grabFrame(img)
-        #         if GotFrame  == 0:
-        #             outputStream.notifyError(CvSink.getError())
-        #             continue
-        # else:
-        #     print("")
-        # print("")
-        # output += "dkjcd"
-        # loopCount += 1
-        # if loopCount%100 == 0:
-        #     print(output)
+    while True:
+        error = grabber.takeError()
+        if error is not None:
+            outputStream.notifyError(error)
+        latest = grabber.getLatest()
+        if latest is None:
+            continue
+        seq, frameTime, grabbedAt, img = latest
+        if recorder is not None:
+            recorder.write(frameTime, img) # before TrackTheTape draws on it
+        detect = throttle.shouldDetect(grabbedAt)
+        results.begin()
+        if sceneCache.unchanged(img, grabbedAt): # nothing has moved since the last detection
+            img = sceneCache.replay(img, results)
+        elif detect:
+            start = time.monotonic()
+            img = TrackTheTape(img, sceneCache.begin(results), tapeParams.snapshot, grabbedAt)
+            throttle.detected(time.monotonic() - start)
+            sceneCache.store(img, grabbedAt)
+        else: # too busy to detect every frame
+            img = PredictTheTape(img, results, grabbedAt)
+        results.publish(seq, frameTime)
+        if publisher is not None:
+            publisher.tick()
+        PutFrameTiming(SmartDashBoardValues, frameTime, grabbedAt, latency)
         outputStream.putFrame(img)
-
-        
\ No newline at end of file
+        stageTimes.publish(diagnostics)
+
+        loopCount += 1
+        if loopCount%100 == 0:
+            SmartDashBoardValues.putNumber('framesProcessed', grabber.processed)
+            SmartDashBoardValues.putNumber('framesDropped', grabber.dropped)
+            SmartDashBoardValues.putNumber('allocFrames', getPool(160, 120).allocFrames)
+            SmartDashBoardValues.putNumber('detectEvery', throttle.every)
+            sceneCache.publish(SmartDashBoardValues)
+            if publisher is not None:
+                publisher.publishStats()
+            latency.publish(SmartDashBoardValues)
+            log.publish(SmartDashBoardValues)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# asyncio version of the exposure switching main loop. Capture, processing and
+# streaming run as separate tasks connected by one-deep queues where the
+# newest frame wins, and the blocking cscore/OpenCV calls run in an executor.
+# Control values come in through NetworkTables entry listeners, so exposure
+# changes are applied when the dashboard changes them instead of being polled
+# every frame.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+class VisionRuntime:
+
+    def __init__(self, camera, sink, outputStream, sd, detector, width, height, exposure=4):
+        self.camera = camera
+        self.sink = sink
+        self.outputStream = outputStream
+        self.sd = sd
+        self.detector = detector
+        self.width = width
+        self.height = height
+        self.exposure = exposure # manual exposure used when ExpAuto is 0
+        self.expAuto = None
+        self.running = False
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def run(self):
+        loop = asyncio.get_event_loop()
+        try:
+            loop.run_until_complete(self.main())
+        except KeyboardInterrupt:
+            self.running = False
+
+    async def main(self):
+        self.loop = asyncio.get_event_loop()
+        # one thread for grabbing, one for processing, one for camera settings
+        self.executor = ThreadPoolExecutor(max_workers=3)
+        self.controls = asyncio.Queue()
+        self.frames = asyncio.Queue(maxsize=1)
+        self.outputs = asyncio.Queue(maxsize=1)
+        # capture, frames, processing, outputs and streaming can each hold one
+        self.free = asyncio.Queue()
+        for i in range(5):
+            self.free.put_nowait(np.zeros(shape=(self.height, self.width, 3), dtype=np.uint8))
+
+        self.running = True
+        self.sd.addEntryListener(self.entryChanged, immediateNotify=True, key='ExpAuto', localNotify=True)
+        tasks = [asyncio.ensure_future(t) for t in (self.captureTask(), self.processTask(), self.streamTask(), self.controlTask())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            self.executor.shutdown(wait=False)
+
+    # called on the NetworkTables thread
+    def entryChanged(self, table, key, value, isNew):
+        self.loop.call_soon_threadsafe(self.controls.put_nowait, (key, value))
+
+    async def controlTask(self):
+        while self.running:
+            key, value = await self.controls.get()
+            if key == 'ExpAuto' and value != self.expAuto:
+                self.expAuto = value
+                if value == 1:
+                    await self.loop.run_in_executor(self.executor, self.camera.setExposureAuto)
+                    neg = [-1,-1] # no tape tracking while the exposure is auto
+                    self.sd.putNumberArray('tape1', neg)
+                    self.sd.putNumberArray('tape2', neg)
+                else:
+                    await self.loop.run_in_executor(self.executor, self.camera.setExposureManual, self.exposure)
+
+    # puts buf on a one-deep queue, giving back whatever was waiting there
+    def putLatest(self, q, buf):
+        if q.full():
+            self.free.put_nowait(q.get_nowait())
+            self.dropped += 1
+        q.put_nowait(buf)
+
+    async def captureTask(self):
+        while self.running:
+            buf = await self.free.get()
+            frameTime, img = await self.loop.run_in_executor(self.executor, self.sink.grabFrame, buf)
+            if frameTime == 0:
+                self.outputStream.notifyError(self.sink.getError())
+                self.free.put_nowait(buf)
+                continue
+            self.captured += 1
+            self.putLatest(self.frames, img)
+
+    async def processTask(self):
+        while self.running:
+            img = await self.frames.get()
+            if self.expAuto != 1:
+                img = await self.loop.run_in_executor(self.executor, self.detector, img, self.sd)
+                self.processed += 1
+            self.putLatest(self.outputs, img)
+
+    async def streamTask(self):
+        while self.running:
+            img = await self.outputs.get()
+            self.outputStream.putFrame(img)
+            self.free.put_nowait(img)
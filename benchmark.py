@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+# Offline benchmark for the detectors. Renders synthetic frames with 2019
+# vision target tape pairs or cargo balls, runs TrackTheTape/TrackTheBall on
+# them against a RecordingTable instead of NetworkTables and reports frames
+# per second and per-frame latency. Needs numpy and OpenCV only, no camera,
+# cscore or NetworkTables.
+#
+#   python3 benchmark.py --detector tape --resolution 640x480 --noise 8
+
+import argparse
+import math
+import sys
+import time
+import numpy as np
+import cv2
+
+from recordingTable import RecordingTable
+from scriptLoader import loadScript
+from colorLookup import ColorLookup
+from visionLog import log
+
+TAPE_WIDTH = 2.0 # inches
+TAPE_LENGTH = 5.5
+TAPE_ANGLE = 14.5 # degrees each strip leans towards the other at the top
+TAPE_GAP = 8.0 # inches between the strips at their closest point
+BALL_DIAMETER = 13.0
+FOV = 60 # horizontal field of view of the camera in degrees
+
+RESOLUTIONS = [(160, 120), (480, 270), (640, 480)]
+
+# HSV bounds put in the stub table, the synthetic targets are drawn in a color well inside them
+TAPE_HSV = {'HL': 0, 'HU': 57, 'SL': 0, 'SU': 167, 'VL': 94, 'VU': 255}
+BALL_HSV = {'HL': 19, 'HU': 41, 'SL': 237, 'SU': 255, 'VL': 67, 'VU': 135}
+
+DETECTORS = {
+    'tape': ('Vision Code.py', 'TrackTheTape', TAPE_HSV),
+    'ball': ('Ball_Detection_Vision_Code .py', 'TrackTheBall', BALL_HSV),
+}
+
+
+# the BGR color inside the bounds that most often stays inside them once noise
+# is added, narrow bounds like the ball's can't take noise in the middle of them
+def targetColor(bounds, noise, rng):
+    lower = (bounds['HL'], bounds['SL'], bounds['VL'])
+    upper = (bounds['HU'], bounds['SU'], bounds['VU'])
+    steps = [np.linspace(lo, hi, 5).round() for lo, hi in zip(lower, upper)]
+    hsv = np.array(np.meshgrid(*steps, indexing='ij')).reshape(3, -1).T
+    colors = cv2.cvtColor(hsv.astype(np.uint8).reshape(1, -1, 3), cv2.COLOR_HSV2BGR).reshape(-1, 3)
+    samples = np.repeat(colors[:, None, :], 200, axis=1).astype(np.int16)
+    if noise > 0:
+        samples += rng.normal(0, noise, samples.shape).astype(np.int16)
+    np.clip(samples, 0, 255, out=samples)
+    inside = cv2.inRange(cv2.cvtColor(samples.astype(np.uint8), cv2.COLOR_BGR2HSV), lower, upper)
+    return tuple(int(c) for c in colors[np.argmax((inside > 0).mean(axis=1))])
+
+def focalLength(width):
+    return (width/2)/math.tan(math.radians(FOV/2))
+
+# corners of a tape strip centered at (cx, cy), lean is positive when the top leans right
+def tapeCorners(cx, cy, lean, scale):
+    theta = math.radians(lean)
+    up = np.array([math.sin(theta), -math.cos(theta)])*TAPE_LENGTH/2*scale
+    across = np.array([math.cos(theta), math.sin(theta)])*TAPE_WIDTH/2*scale
+    center = np.array([cx, cy])
+    return np.array([center + up - across, center + up + across, center - up + across, center - up - across])
+
+def background(width, height, rng):
+    frame = np.empty(shape=(height, width, 3), dtype=np.uint8)
+    frame[:] = rng.integers(10, 50)
+    return frame
+
+def addNoise(frame, noise, rng):
+    if noise > 0:
+        noisy = frame.astype(np.int16) + rng.normal(0, noise, frame.shape).astype(np.int16)
+        np.clip(noisy, 0, 255, out=noisy)
+        frame[:] = noisy
+
+# draws a tape pair distance inches away, offset inches to the side of the camera
+# and rise (a fraction of the frame height) above the middle
+def renderTapeFrame(width, height, distance, offset, rise, noise, rng, color):
+    frame = background(width, height, rng)
+    scale = focalLength(width)/distance # pixels per inch at the target
+    theta = math.radians(TAPE_ANGLE)
+    # centers are placed so the top inner corners are TAPE_GAP apart
+    half = TAPE_GAP/2 + math.sin(theta)*TAPE_LENGTH/2 + math.cos(theta)*TAPE_WIDTH/2
+    cx = width/2 + offset*scale
+    cy = height/2 - rise*height
+    for side, lean in ((-1, TAPE_ANGLE), (1, -TAPE_ANGLE)):
+        corners = tapeCorners(cx + side*half*scale, cy, lean + rng.uniform(-2, 2), scale)
+        cv2.fillConvexPoly(frame, np.int32(np.round(corners)), color, cv2.LINE_AA)
+    addNoise(frame, noise, rng)
+    return frame
+
+def renderBallFrame(width, height, distance, offset, rise, noise, rng, color):
+    frame = background(width, height, rng)
+    scale = focalLength(width)/distance
+    center = (int(width/2 + offset*scale), int(height/2 - rise*height))
+    cv2.circle(frame, center, max(1, int(BALL_DIAMETER/2*scale)), color, -1, cv2.LINE_AA)
+    addNoise(frame, noise, rng)
+    return frame
+
+# the target drifts a little from frame to frame like it would while driving up to it
+def renderFrames(detector, width, height, count, noise, distances, rng, color):
+    render = renderTapeFrame if detector == 'tape' else renderBallFrame
+    frames = []
+    distance = rng.uniform(*distances)
+    offset = rng.uniform(-12, 12)
+    rise = rng.uniform(-0.2, 0.2)
+    for i in range(count):
+        distance = float(np.clip(distance + rng.normal(0, 2), *distances))
+        offset = float(np.clip(offset + rng.normal(0, 0.5), -12, 12))
+        rise = float(np.clip(rise + rng.normal(0, 0.01), -0.2, 0.2))
+        frames.append(render(width, height, distance, offset, rise, noise, rng, color))
+    return frames
+
+# true if the puts from one frame include a detection, tracker predictions don't count
+def foundTarget(name, puts):
+    if name == 'tape':
+        values = dict((key, value) for method, key, value in puts)
+        return values.get('targetMeasured', True) is not False and list(values.get('centerN', [-1, -1])) != [-1, -1]
+    for method, key, value in puts:
+        if key.startswith('Center'):
+            return True
+    return False
+
+# forgets everything the detector carried over from the last run
+def resetScript(script):
+    for name in ('roi', 'tracker', 'pose'):
+        if hasattr(script, name):
+            getattr(script, name).reset()
+
+def runDetector(name, detect, frames, table, repeat):
+    work = np.empty_like(frames[0])
+    times = []
+    found = []
+    for r in range(repeat):
+        for frame in frames:
+            np.copyto(work, frame) # detectors draw on the frame
+            table.clear()
+            start = time.perf_counter()
+            detect(work, table)
+            times.append(time.perf_counter() - start)
+            found.append(foundTarget(name, table.puts))
+    return np.array(times), np.array(found, dtype=bool)
+
+# the fps over the frames where something was found is given separately, as
+# frames with nothing in them take a much shorter path through the detector
+def report(name, width, height, times, found):
+    ms = times*1000
+    foundFps = "%8.1f fps" % (found.sum()/times[found].sum()) if found.any() else "%12s" % "-"
+    print("%-5s %4dx%-4d %6d frames %8.1f fps   mean %7.3f ms   p50 %7.3f ms   p95 %7.3f ms   max %7.3f ms   found %5.1f%% %s" % (
+        name, width, height, len(times), len(times)/times.sum(), ms.mean(), np.percentile(ms, 50), np.percentile(ms, 95), ms.max(), 100.0*found.mean(), foundFps))
+
+def parseResolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vision detectors on synthetic frames")
+    parser.add_argument('--detector', choices=['tape', 'ball', 'all'], default='all')
+    parser.add_argument('--resolution', type=parseResolution, action='append', help="WIDTHxHEIGHT, can be given more than once (default 160x120, 480x270 and 640x480)")
+    parser.add_argument('--frames', type=int, default=50, help="distinct frames rendered per resolution")
+    parser.add_argument('--repeat', type=int, default=10, help="times each frame is run through the detector")
+    parser.add_argument('--noise', type=float, default=4.0, help="standard deviation of the pixel noise")
+    parser.add_argument('--distance', type=float, nargs=2, default=[24.0, 120.0], metavar=('MIN', 'MAX'), help="target distance range in inches")
+    parser.add_argument('--seed', type=int, default=7539)
+    parser.add_argument('--no-roi', dest='roi', action='store_false', help="search the whole frame every time in TrackTheTape")
+    parser.add_argument('--no-pyramid', dest='pyramid', action='store_false', help="search big frames at full resolution instead of coarse-to-fine")
+    parser.add_argument('--lookup', choices=['full', 'quantized'], help="threshold with a ColorLookup table instead of cvtColor and inRange")
+    args = parser.parse_args()
+    log.stream = sys.stderr # the detectors still log as they would on the Pi, but not into the report
+
+    names = ['tape', 'ball'] if args.detector == 'all' else [args.detector]
+    resolutions = args.resolution or RESOLUTIONS
+    for name in names:
+        path, function, bounds = DETECTORS[name]
+        script = loadScript(path)
+        detect = getattr(script, function)
+        if hasattr(script, 'roi'):
+            script.roi.enabled = args.roi
+        if hasattr(script, 'pyramid'):
+            script.pyramid.enabled = args.pyramid
+        if args.lookup:
+            script.colorLookup = ColorLookup(args.lookup, background=False) # time the lookup, not cvtColor while it builds
+        color = targetColor(bounds, args.noise, np.random.default_rng(args.seed))
+        for width, height in resolutions:
+            rng = np.random.default_rng(args.seed)
+            frames = renderFrames(name, width, height, args.frames, args.noise, args.distance, rng, color)
+            table = RecordingTable(bounds)
+            resetScript(script)
+            times, found = runDetector(name, detect, frames, table, args.repeat)
+            report(name, width, height, times, found)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+# Captures and processes several cameras at once, each on its own thread with
+# its own frame rate budget. The camera facing the way the robot is driving
+# (read from a NetworkTables key) gets the higher priority, and when the CPU
+# is saturated the lower priority cameras are slowed down first.
+#
+# Saturated means either the whole Pi is busy (from /proc/stat, so the MJPEG
+# servers and anything else running count too) or this process is using most
+# of one core. The camera threads share the GIL, so the process measured
+# against all four cores would never get near the limit while the Python
+# parts of the loops were already stalling each other.
+
+import threading
+import time
+import numpy as np
+
+
+class ScheduledCamera:
+
+    def __init__(self, name, sink, outputStream, detector, table, width, height, fps, direction):
+        self.name = name
+        self.sink = sink
+        self.outputStream = outputStream
+        self.detector = detector
+        self.table = table # where this camera's detector puts its results
+        self.img = np.zeros(shape=(height, width, 3), dtype=np.uint8)
+        self.fps = fps # frame rate budget
+        self.rate = fps # frame rate currently allowed by the scheduler
+        self.direction = direction # drive direction this camera looks at
+        self.priority = 0
+        self.processing = True # when False frames are streamed without being processed
+        self.frames = 0
+        self.busy = 0.0 # seconds spent grabbing and processing since the last check
+
+
+# (total, idle) jiffies over all cores, None where there is no /proc/stat
+def readCpuTimes():
+    try:
+        with open('/proc/stat') as f:
+            fields = f.readline().split()
+    except OSError:
+        return None
+    values = [int(v) for v in fields[1:9]] # user nice system idle iowait irq softirq steal, guest is already in user
+    return sum(values), values[3] + values[4]
+
+
+class CameraScheduler:
+
+    def __init__(self, sd, directionKey='DriveDirection', cpuLimit=0.85, minFps=2, checkPeriod=0.5):
+        self.sd = sd
+        self.directionKey = directionKey
+        self.cpuLimit = cpuLimit # fraction of all cores, and of the one core the GIL allows us, we try to stay under
+        self.minFps = minFps
+        self.checkPeriod = checkPeriod
+        self.cameras = []
+        self.lock = threading.Lock()
+        self.running = False
+        self.cpuLoad = 0.0 # the higher of the two below
+        self.systemLoad = 0.0 # fraction of all cores busy
+        self.processLoad = 0.0 # CPU time this process used over the time passed, against one core
+
+    def addCamera(self, name, sink, outputStream, detector, table, width, height, fps, direction):
+        camera = ScheduledCamera(name, sink, outputStream, detector, table, width, height, fps, direction)
+        self.cameras.append(camera)
+        return camera
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self.cameraLoop, args=(camera,), name=camera.name) for camera in self.cameras]
+        self.threads.append(threading.Thread(target=self.controlLoop, name="CameraScheduler"))
+        for t in self.threads:
+            t.daemon = True
+            t.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        for t in self.threads:
+            t.join()
+
+    def cameraLoop(self, camera):
+        nextTime = time.monotonic()
+        while self.running:
+            start = time.monotonic()
+            GotFrame, img = camera.sink.grabFrame(camera.img)
+            if GotFrame == 0:
+                camera.outputStream.notifyError(camera.sink.getError())
+                continue
+            camera.img = img
+            if camera.processing:
+                img = camera.detector(img, camera.table)
+            camera.outputStream.putFrame(img)
+            end = time.monotonic()
+            with self.lock:
+                camera.frames += 1
+                camera.busy += end - start
+
+            # wait for this camera's next slot, without trying to catch up on missed ones
+            nextTime = max(nextTime + 1.0/camera.rate, end)
+            if nextTime > end:
+                time.sleep(nextTime - end)
+
+    # sets priorities from the drive direction and moves the frame rates
+    # towards what the CPU can handle
+    def controlLoop(self):
+        lastCpu = time.process_time()
+        lastTime = time.monotonic()
+        lastSystem = readCpuTimes()
+        while self.running:
+            time.sleep(self.checkPeriod)
+            now = time.monotonic()
+            cpu = time.process_time()
+            system = readCpuTimes()
+            elapsed = now - lastTime
+            self.processLoad = (cpu - lastCpu)/elapsed
+            if system is not None and lastSystem is not None and system[0] > lastSystem[0]:
+                self.systemLoad = 1 - (system[1] - lastSystem[1])/(system[0] - lastSystem[0])
+            self.cpuLoad = max(self.systemLoad, self.processLoad)
+            lastCpu, lastTime, lastSystem = cpu, now, system
+
+            direction = self.sd.getNumber(self.directionKey, 1)
+            for camera in self.cameras:
+                camera.priority = 1 if camera.direction == direction else 0
+            # lowest priority first
+            byPriority = sorted(self.cameras, key=lambda c: c.priority)
+
+            if self.cpuLoad > self.cpuLimit:
+                for camera in byPriority:
+                    if camera.rate > self.minFps:
+                        camera.rate = max(self.minFps, camera.rate*0.7)
+                        break
+            elif self.cpuLoad < self.cpuLimit*0.8:
+                for camera in reversed(byPriority):
+                    if camera.rate < camera.fps:
+                        camera.rate = min(camera.fps, camera.rate*1.25)
+                        break
+
+            with self.lock:
+                for camera in self.cameras:
+                    camera.table.putNumber('fps', camera.frames/elapsed)
+                    camera.table.putNumber('fpsLimit', camera.rate)
+                    camera.table.putNumber('busy', camera.busy/elapsed)
+                    camera.frames = 0
+                    camera.busy = 0.0
+            self.sd.putNumber('visionCpuLoad', self.cpuLoad)
+            self.sd.putNumber('visionSystemLoad', self.systemLoad)
+            self.sd.putNumber('visionProcessLoad', self.processLoad)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Sits in front of a NetworkTables table and only passes a put on when the
+# value moved by more than the key's deadband since it was last sent, so a
+# target that is sitting still doesn't use up radio bandwidth every frame.
+# Every keepalive seconds tick() sends any value still held back by its
+# deadband and bumps a heartbeat counter, so the robot can tell stale data
+# (the heartbeat stops) from a target that isn't moving.
+#
+# Keys the dashboard writes as well (calibrationSave) always go straight
+# through, as the value last sent from here says nothing about what is in
+# the table now.
+
+import numbers
+import time
+
+
+class ChangeOnlyTable:
+
+    def __init__(self, sd, deadbands=None, keepalive=1.0, heartbeatKey='visionHeartbeat', shared=('calibrationSave',)):
+        self.sd = sd
+        self.shared = set(shared) # keys other clients write too, never held back
+        self.deadbands = dict(deadbands or {}) # key -> smallest change worth sending, 0 for any change
+        self.keepalive = keepalive
+        self.heartbeatKey = heartbeatKey
+        self.sent = {} # key -> last value sent
+        self.latest = {} # key -> (method, value) last put, sent or not
+        self.heartbeat = 0
+        self.lastKeepalive = time.monotonic()
+        self.sentCount = 0
+        self.suppressedCount = 0
+
+    def getNumber(self, key, defaultValue):
+        return self.sd.getNumber(key, defaultValue)
+
+    def getNumberArray(self, key, defaultValue):
+        return self.sd.getNumberArray(key, defaultValue)
+
+    def getBoolean(self, key, defaultValue):
+        return self.sd.getBoolean(key, defaultValue)
+
+    def putNumber(self, key, value):
+        return self.put('putNumber', key, value)
+
+    def putNumberArray(self, key, value):
+        return self.put('putNumberArray', key, list(value))
+
+    def putBoolean(self, key, value):
+        return self.put('putBoolean', key, value)
+
+    def put(self, method, key, value):
+        if key in self.shared:
+            self.sentCount += 1
+            return getattr(self.sd, method)(key, value)
+        self.latest[key] = (method, value)
+        if key in self.sent and not self.changed(key, self.sent[key], value):
+            self.suppressedCount += 1
+            return True
+        return self.send(method, key, value)
+
+    def send(self, method, key, value):
+        self.sent[key] = value
+        self.sentCount += 1
+        return getattr(self.sd, method)(key, value)
+
+    def changed(self, key, old, new):
+        deadband = self.deadbands.get(key, 0)
+        if isinstance(new, bool) or isinstance(old, bool):
+            return new != old
+        if isinstance(new, list):
+            if not isinstance(old, list) or len(old) != len(new):
+                return True
+            return any(abs(a - b) > deadband for a, b in zip(old, new))
+        if isinstance(new, numbers.Number) and isinstance(old, numbers.Number):
+            return abs(new - old) > deadband
+        return new != old
+
+    # call once a frame, sends whatever the deadbands are holding back once every keepalive seconds
+    def tick(self):
+        now = time.monotonic()
+        if now - self.lastKeepalive < self.keepalive:
+            return
+        self.lastKeepalive = now
+        for key, (method, value) in list(self.latest.items()):
+            if self.sent.get(key) != value:
+                self.send(method, key, value)
+        self.heartbeat += 1
+        self.sd.putNumber(self.heartbeatKey, self.heartbeat)
+
+    def publishStats(self):
+        self.sd.putNumber('ntSent', self.sentCount)
+        self.sd.putNumber('ntSuppressed', self.suppressedCount)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+# Thresholds a BGR frame with a lookup table instead of cvtColor to HSV and
+# inRange. The table says for every BGR color whether it is inside the HSV
+# bounds, so the mask comes from one table lookup per pixel. It is built
+# with the same cvtColor and inRange calls it replaces, only rebuilt when the
+# bounds change and saved to disk so a restart with the same bounds loads it
+# straight away.
+#
+# A build takes a fraction of a second on a desktop and a lot longer on a Pi,
+# so by default it runs on a background thread. The table for the old bounds
+# is used until the new one is ready. Before the first table exists,
+# setBounds returns False and the caller thresholds with cvtColor and inRange.
+# Only the maxCached most recently used tables are kept on disk.
+#
+# 'full' mode covers all 2^24 colors exactly as a 2 MB bitset. 'quantized'
+# mode drops the low bits of each channel and keeps a byte per entry, e.g.
+# 32 KB at 5 bits per channel, which is faster but only approximate near the
+# edges of the bounds.
+
+import os
+import threading
+import numpy as np
+import cv2
+
+from visionLog import log
+
+cacheDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lutcache')
+
+
+class ColorLookup:
+
+    def __init__(self, mode='full', bits=5, cacheDir=cacheDir, maxCached=8, background=True):
+        if mode not in ('full', 'quantized'):
+            raise ValueError("unknown lookup mode '{}'".format(mode))
+        self.mode = mode
+        self.bits = bits # bits kept per channel in quantized mode
+        self.cacheDir = cacheDir
+        self.maxCached = maxCached # tables kept in cacheDir, the least recently used go first
+        self.background = background # False builds in setBounds, e.g. for benchmarks
+        self.bounds = None # the bounds asked for
+        self.table = None
+        self.tableBounds = None # the bounds table was made for, behind bounds while a build runs
+        self.builder = None
+        self.scratch = None # buffers for the lookup, views of them are used for smaller frames and crops
+        self.builds = 0
+
+    # True when there is a table to threshold with, which may still be for the
+    # last bounds while the one for these is built
+    def setBounds(self, lower, upper):
+        bounds = (tuple(float(v) for v in lower), tuple(float(v) for v in upper))
+        if bounds != self.bounds:
+            self.bounds = bounds
+            path = self.cachePath(bounds)
+            if path is not None and os.path.exists(path):
+                self.load(bounds, path)
+        if self.tableBounds != self.bounds:
+            if not self.background:
+                self.build()
+            elif self.builder is None or not self.builder.is_alive(): # a forked worker has no builder until it starts one
+                self.builder = threading.Thread(target=self.build, name="ColorLookup", daemon=True)
+                self.builder.start()
+        return self.table is not None
+
+    def load(self, bounds, path):
+        try:
+            table = np.load(path)
+            os.utime(path) # most recently used
+        except (OSError, ValueError) as err:
+            log.warning('lookupLoad', "could not load lookup table from '%s': %s", path, err)
+            return
+        self.table, self.tableBounds = table, bounds
+
+    # builds tables until one is made for the latest bounds asked for
+    def build(self):
+        while self.tableBounds != self.bounds:
+            bounds = self.bounds
+            table = self.buildFull(bounds) if self.mode == 'full' else self.buildQuantized(bounds)
+            self.builds += 1
+            self.table, self.tableBounds = table, bounds
+            self.save(bounds, table)
+
+    def save(self, bounds, table):
+        path = self.cachePath(bounds)
+        if path is None:
+            return
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            np.save(path, table)
+            self.prune()
+        except OSError as err:
+            log.warning('lookupSave', "could not save lookup table to '%s': %s", path, err)
+
+    # removes all but the maxCached most recently used tables
+    def prune(self):
+        paths = [os.path.join(self.cacheDir, name) for name in os.listdir(self.cacheDir) if name.endswith('.npy')]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[self.maxCached:]:
+            os.remove(path)
+
+    def cachePath(self, bounds):
+        if self.cacheDir is None:
+            return None
+        lower, upper = bounds
+        name = "%s-%d-%s.npy" % (self.mode, self.bits if self.mode == 'quantized' else 8,
+                                 "-".join("%g" % v for v in lower + upper))
+        return os.path.join(self.cacheDir, name)
+
+    # bit (b<<16 | g<<8 | r) of the table is set when that color is in bounds
+    def buildFull(self, bounds):
+        lower, upper = bounds
+        g, r = np.mgrid[0:256, 0:256].astype(np.uint8)
+        image = np.empty(shape=(256, 256, 3), dtype=np.uint8)
+        image[:, :, 1] = g
+        image[:, :, 2] = r
+        weights = (1 << np.arange(8)).astype(np.uint8)
+        table = np.empty(1 << 21, dtype=np.uint8)
+        for b in range(256): # one blue value at a time, all green and red
+            image[:, :, 0] = b
+            mask = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2HSV), lower, upper)
+            bits = (mask.reshape(-1, 8) & 1)*weights
+            table[b*8192:(b + 1)*8192] = bits.sum(axis=1, dtype=np.uint8)
+        return table
+
+    # byte ((b>>s)<<2q | (g>>s)<<q | r>>s) of the table is 255 when the middle
+    # of that color bin is in bounds
+    def buildQuantized(self, bounds):
+        lower, upper = bounds
+        q = self.bits
+        shift = 8 - q
+        levels = (np.arange(1 << q) << shift) + ((1 << shift) >> 1)
+        b, g, r = np.meshgrid(levels, levels, levels, indexing='ij')
+        image = np.dstack((b.reshape(1 << q, -1), g.reshape(1 << q, -1), r.reshape(1 << q, -1))).astype(np.uint8)
+        return cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2HSV), lower, upper).ravel()
+
+    # height x width views of the scratch buffers, which only grow when a bigger frame comes along
+    def buffers(self, height, width):
+        if self.scratch is None or height > self.scratch[0].shape[0] or width > self.scratch[0].shape[1]:
+            shape = (height, width)
+            if self.scratch is not None:
+                shape = (max(height, self.scratch[0].shape[0]), max(width, self.scratch[0].shape[1]))
+            self.scratch = (np.empty(shape=shape, dtype=np.uint32), np.empty(shape=shape, dtype=np.uint32), np.empty(shape=shape, dtype=np.uint8))
+        return [buf[:height, :width] for buf in self.scratch]
+
+    # writes the 0/255 mask of frame into mask, which must be the same height and width
+    def threshold(self, frame, mask):
+        b, g, r = frame[:, :, 0], frame[:, :, 1], frame[:, :, 2]
+        index, tmp, byte = self.buffers(frame.shape[0], frame.shape[1])
+        if self.mode == 'full':
+            np.left_shift(b, 16, out=index, dtype=np.uint32)
+            np.left_shift(g, 8, out=tmp, dtype=np.uint32)
+            np.bitwise_or(index, tmp, out=index)
+            np.bitwise_or(index, r, out=index)
+            np.right_shift(index, 3, out=index) # byte in the bitset
+            np.take(self.table, index, out=byte, mode='clip')
+            np.bitwise_and(r, 7, out=mask) # bit in the byte is the low bits of red
+            np.right_shift(byte, mask, out=byte)
+            np.bitwise_and(byte, 1, out=byte)
+            np.multiply(byte, 255, out=mask)
+        else:
+            q = self.bits
+            shift = 8 - q
+            np.right_shift(b, shift, out=byte)
+            np.left_shift(byte, 2*q, out=index, dtype=np.uint32)
+            np.right_shift(g, shift, out=byte)
+            np.left_shift(byte, q, out=tmp, dtype=np.uint32)
+            np.bitwise_or(index, tmp, out=index)
+            np.right_shift(r, shift, out=byte)
+            np.bitwise_or(index, byte, out=index)
+            np.take(self.table, index, out=mask, mode='clip')
+        return mask
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Builds a table with the geometry of every contour in one pass, so the
+# detector never has to call contourArea or minAreaRect on the same contour
+# twice. Rows are a NumPy structured array, so picking candidates and
+# comparing them is done on whole columns.
+
+import numpy as np
+import cv2
+
+from tapeGeometry import boxesOf, foldAngle
+
+FEATURES = np.dtype([
+    ('index', np.int32), # position of the contour in the findContours list
+    ('area', np.float64),
+    ('cx', np.float64), # center of the rotated rect
+    ('cy', np.float64),
+    ('width', np.float64), # size and angle as given by minAreaRect
+    ('height', np.float64),
+    ('angle', np.float64),
+    ('ratio', np.float64), # long side over short side, always >= 1
+    ('tilt', np.float64), # angle of the long side in degrees, in (-90, 90] with y going down
+])
+
+
+def buildFeatureTable(cnts, minArea=0):
+    rows = []
+    for i, c in enumerate(cnts):
+        area = cv2.contourArea(c)
+        if area < minArea: # too small to be tape, skip the rect fit
+            continue
+        (cx, cy), (w, h), angle = cv2.minAreaRect(c)
+        rows.append((i, area, cx, cy, w, h, angle, 0.0, 0.0))
+    table = np.array(rows, dtype=FEATURES)
+    if len(table) == 0:
+        return table
+
+    longSide = np.maximum(table['width'], table['height'])
+    shortSide = np.minimum(table['width'], table['height'])
+    table['ratio'] = longSide/np.maximum(shortSide, 1e-6)
+    # minAreaRect's angle is along the width, the long side is 90 degrees round when height is longer
+    table['tilt'] = foldAngle(np.where(table['width'] >= table['height'], table['angle'], table['angle'] + 90))
+    return table
+
+# (N, 4, 2) corners of every row
+def boxesFor(table):
+    return boxesOf(table['cx'], table['cy'], table['width'], table['height'], table['angle'])
+
+# the k largest rows by area, largest first
+def topK(table, k):
+    if len(table) > k:
+        table = table[np.argpartition(-table['area'], k - 1)[:k]]
+    return table[np.argsort(-table['area'])]
+
+def rectOf(row):
+    return (row['cx'], row['cy']), (row['width'], row['height']), row['angle']
+
+def boxOf(row):
+    return np.int0(cv2.boxPoints(rectOf(row)))
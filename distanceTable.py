@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# Distance to the target from its width in pixels, from a table measured at
+# the practice field instead of a pinhole model of the lens. While
+# calibrationDistance is set on the dashboard every frame with a target adds
+# a (pixel width, true distance) sample. Putting calibrationSave to True
+# builds the table and saves it in a JSON file, one table per camera and
+# resolution.
+#
+# The two dashboard keys are read through a ParameterCache listening on the
+# table given to listen(). The calibration does its own puts on that table,
+# so they aren't part of the detector's results (and aren't replayed by
+# SceneCache).
+#
+# The table is made monotone (wider is never further away) and filled in at
+# every quarter pixel up to the frame width, so a lookup is a single index.
+# Beyond the measured widths the distance falls off as 1/width.
+
+import json
+import os
+import numpy as np
+
+from paramCache import ParameterCache
+from visionLog import log
+
+STEPS = 4 # table entries per pixel of width
+
+
+class DistanceTable:
+
+    def __init__(self, widths, distances, maxWidth):
+        order = np.argsort(widths)
+        self.widths = np.asarray(widths, dtype=np.float64)[order]
+        # running minimum from the narrow end, so the distance never goes up as the width does
+        self.distances = np.minimum.accumulate(np.asarray(distances, dtype=np.float64)[order])
+        self.maxWidth = maxWidth
+        grid = np.arange(int(maxWidth*STEPS) + 1)/STEPS
+        dense = np.interp(grid, self.widths, self.distances)
+        with np.errstate(divide='ignore'):
+            narrow = grid < self.widths[0]
+            dense[narrow] = self.distances[0]*self.widths[0]/grid[narrow]
+            wide = grid > self.widths[-1]
+            dense[wide] = self.distances[-1]*self.widths[-1]/grid[wide]
+        dense[0] = np.inf
+        self.dense = dense.tolist() # a list indexes faster than an array for one value
+        self.last = len(self.dense) - 1
+
+    def lookup(self, width):
+        return self.dense[min(max(int(width*STEPS + 0.5), 0), self.last)]
+
+    def toJson(self):
+        return {'widths': self.widths.tolist(), 'distances': self.distances.tolist(), 'maxWidth': self.maxWidth}
+
+
+def loadTables(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def loadTable(path, key):
+    entry = loadTables(path).get(key)
+    if entry is None:
+        return None
+    return DistanceTable(entry['widths'], entry['distances'], entry['maxWidth'])
+
+def saveTable(path, key, table):
+    tables = loadTables(path)
+    tables[key] = table.toJson()
+    with open(path, 'w') as f:
+        json.dump(tables, f, indent=4, sort_keys=True)
+
+
+class DistanceCalibration:
+
+    def __init__(self, path, camera, width, height):
+        self.path = path
+        self.key = "{} {}x{}".format(camera, width, height)
+        self.maxWidth = width
+        self.table = loadTable(path, self.key)
+        self.samples = {} # true distance -> pixel widths seen at it
+        self.params = ParameterCache({'calibrationDistance': 0, 'calibrationSave': False})
+        self.sd = None # the dashboard table, nothing is calibrated until listen() is called
+
+    def listen(self, sd):
+        self.sd = sd
+        self.params.listen(sd)
+        return self
+
+    # distance for a target this many pixels wide, None without a table
+    def lookup(self, width):
+        if self.table is None:
+            return None
+        return self.table.lookup(width)
+
+    # records a sample while calibrationDistance is above 0 and builds and
+    # saves the table when calibrationSave is set
+    def update(self, width):
+        if self.sd is None:
+            return
+        params = self.params.snapshot
+        distance = params['calibrationDistance']
+        if distance > 0 and width > 0:
+            self.samples.setdefault(distance, []).append(width)
+            self.sd.putNumber('calibrationSamples', sum(len(w) for w in self.samples.values()))
+        if params['calibrationSave']:
+            self.params.set('calibrationSave', False) # don't save again before the listener hears of the put
+            self.sd.putBoolean('calibrationSave', False)
+            self.save()
+
+    def save(self):
+        if len(self.samples) < 2:
+            log.warning('calibrationSave', "need samples at 2 or more distances to build a distance table, have %d", len(self.samples))
+            return
+        distances = sorted(self.samples)
+        widths = [float(np.median(self.samples[d])) for d in distances]
+        self.table = DistanceTable(widths, distances, self.maxWidth)
+        try:
+            saveTable(self.path, self.key, self.table)
+            log.info('calibrationSave', "saved distance table for '%s' to '%s'", self.key, self.path)
+        except OSError as err:
+            log.warning('calibrationSave', "could not save distance table to '%s': %s", self.path, err)
+        self.samples = {}
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+# Holds a loop at a target frame rate by timing each pass and sleeping only
+# for whatever is left of the frame period. The rate can be boosted for a
+# while, e.g. when the robot is lining up on a target.
+
+import time
+
+
+class FrameGovernor:
+
+    def __init__(self, targetFps=30, boostFps=60):
+        self.targetFps = targetFps
+        self.boostFps = boostFps
+        self.boosted = False
+        self.boostUntil = None
+        self.achievedFps = 0.0
+        self.lastTick = None
+        self.nextTick = None
+
+    def setTarget(self, fps):
+        self.targetFps = fps
+
+    # raises the rate to fps (boostFps by default), until unboost() or for
+    # duration seconds if given
+    def boost(self, fps=None, duration=None):
+        if fps is not None:
+            self.boostFps = fps
+        self.boosted = True
+        self.boostUntil = None if duration is None else time.monotonic() + duration
+
+    def unboost(self):
+        self.boosted = False
+        self.boostUntil = None
+
+    def currentTarget(self):
+        if self.boosted and self.boostUntil is not None and time.monotonic() > self.boostUntil:
+            self.unboost()
+        return self.boostFps if self.boosted else self.targetFps
+
+    # call once at the end of every loop
+    def wait(self):
+        now = time.monotonic()
+        target = self.currentTarget()
+        period = 1.0/target if target > 0 else 0.0
+        if self.nextTick is None or now - self.nextTick > period:
+            self.nextTick = now # fell more than a frame behind, don't try to catch up
+        self.nextTick += period
+        if self.nextTick > now:
+            time.sleep(self.nextTick - now)
+
+        tick = time.monotonic()
+        if self.lastTick is not None:
+            fps = 1.0/max(tick - self.lastTick, 1e-6)
+            self.achievedFps = 0.9*self.achievedFps + 0.1*fps if self.achievedFps else fps
+        self.lastTick = tick
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# Grabs frames from a CvSink on its own thread so the camera wait does not add
+# to the processing time. The newest frame always wins: if the processing
+# thread has not picked up the last frame by the time a new one arrives, the
+# old one is dropped and counted.
+
+import threading
+import time
+import numpy as np
+
+
+class FrameGrabber:
+
+    def __init__(self, sink, width, height):
+        self.sink = sink
+        # three slots: one being captured into, one ready to be picked up and
+        # one held by the processing thread, so a capture never writes over
+        # the frame that is being processed
+        self.buffers = [np.zeros(shape=(height, width, 3), dtype=np.uint8) for i in range(3)]
+        self.captureSlot = 0
+        self.readySlot = None
+        self.processSlot = 2
+        self.spareSlot = 1
+
+        self.seq = 0 # sequence number of the newest captured frame
+        self.readySeq = 0
+        self.readyTime = 0 # cscore frame time in microseconds
+        self.readyGrabbedAt = 0.0 # time.monotonic() when grabFrame returned
+        self.captured = 0
+        self.dropped = 0 # frames overwritten before the processing thread took them
+        self.processed = 0
+        self.errors = 0
+        self.error = None
+
+        self.lock = threading.Lock()
+        self.newFrame = threading.Condition(self.lock)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.captureLoop, name="FrameGrabber")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            self.newFrame.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+    def captureLoop(self):
+        while self.running:
+            buf = self.buffers[self.captureSlot]
+            frameTime, frame = self.sink.grabFrame(buf)
+            grabbedAt = time.monotonic()
+            if frameTime == 0:
+                with self.lock:
+                    self.errors += 1
+                    self.error = self.sink.getError()
+                continue
+            if frame is not buf: # cscore gave us a new array, keep using it
+                self.buffers[self.captureSlot] = frame
+
+            with self.lock:
+                self.seq += 1
+                self.captured += 1
+                if self.readySlot is not None: # nobody took the last frame
+                    self.dropped += 1
+                    self.spareSlot = self.readySlot
+                self.readySlot = self.captureSlot
+                self.readySeq = self.seq
+                self.readyTime = frameTime
+                self.readyGrabbedAt = grabbedAt
+                self.captureSlot = self.spareSlot
+                self.spareSlot = None
+                self.newFrame.notify()
+
+    # Waits for a frame newer than the last one handed out and returns
+    # (seq, frameTime, grabbedAt, frame). The frame stays valid until the
+    # next call. Returns None on timeout or when the grabber is stopped.
+    def getLatest(self, timeout=1.0):
+        with self.lock:
+            if self.readySlot is None:
+                self.newFrame.wait(timeout)
+            if self.readySlot is None:
+                return None
+            self.spareSlot = self.processSlot
+            self.processSlot = self.readySlot
+            self.readySlot = None
+            self.processed += 1
+            return self.readySeq, self.readyTime, self.readyGrabbedAt, self.buffers[self.processSlot]
+
+    def takeError(self):
+        with self.lock:
+            error = self.error
+            self.error = None
+            return error
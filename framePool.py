@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+# Preallocated image buffers for one video mode, so the tracking loops can
+# pass them as dst to every OpenCV call instead of getting fresh arrays each
+# frame. check() notes any call that handed back a new array anyway (wrong
+# shape or type) and frames where that happened are counted in allocFrames.
+
+import numpy as np
+
+from visionLog import log
+
+
+class FramePool:
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.bgr = np.zeros(shape=(height, width, 3), dtype=np.uint8) # camera frame
+        self.hsv = np.zeros(shape=(height, width, 3), dtype=np.uint8)
+        self.mask = np.zeros(shape=(height, width), dtype=np.uint8)
+        self.scratch = np.zeros(shape=(height, width), dtype=np.uint8) # erode/dilate and findContours input
+        self.debug = False
+        self.frames = 0
+        self.allocFrames = 0 # frames where something on the hot path allocated
+        self.allocated = [] # stages that allocated in the current frame
+
+    # returns out, noting the stage if it is not the buffer we passed in
+    def check(self, stage, out, buf):
+        if out is not buf:
+            self.allocated.append(stage)
+        return out
+
+    def endFrame(self):
+        self.frames += 1
+        if self.allocated:
+            self.allocFrames += 1
+            if self.debug:
+                log.info('allocated', "frame %s allocated in %s", self.frames, ", ".join(self.allocated))
+            self.allocated = []
+
+
+pools = {}
+
+# one pool per video mode
+def getPool(width, height):
+    key = (width, height)
+    if key not in pools:
+        pools[key] = FramePool(width, height)
+    return pools[key]
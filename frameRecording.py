@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Recording of raw camera frames. The file is a 16 byte header (magic, width,
+# height) followed by fixed size records of a uint64 frame time and the BGR
+# pixels, so a recording can be memory mapped and each frame used in place
+# without decoding or copying.
+
+import os
+import struct
+import numpy as np
+
+MAGIC = b'FRCVREC1'
+HEADER = struct.Struct('<8sII')
+
+
+def recordType(width, height):
+    return np.dtype([('time', '<u8'), ('frame', np.uint8, (height, width, 3))])
+
+
+class FrameRecorder:
+
+    def __init__(self, path, width, height):
+        self.width = width
+        self.height = height
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            magic, w, h = readHeader(path)
+            if (w, h) != (width, height):
+                raise ValueError("'{}' holds {}x{} frames, not {}x{}".format(path, w, h, width, height))
+        self.file = open(path, 'ab')
+        if not exists:
+            self.file.write(HEADER.pack(MAGIC, width, height))
+        self.count = 0
+
+    def write(self, frameTime, frame):
+        self.file.write(struct.pack('<Q', int(frameTime)))
+        self.file.write(np.ascontiguousarray(frame).data)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def readHeader(path):
+    with open(path, 'rb') as f:
+        magic, width, height = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("'{}' is not a frame recording".format(path))
+    return magic, width, height
+
+# Memory maps a recording. The default copy-on-write mode lets detectors draw
+# on the frames without touching the file.
+def openRecording(path, mode='c'):
+    magic, width, height = readHeader(path)
+    dtype = recordType(width, height)
+    count = (os.path.getsize(path) - HEADER.size)//dtype.itemsize
+    return np.memmap(path, dtype=dtype, mode=mode, offset=HEADER.size, shape=(count,))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+# Rolling record of how long frames take from capture to their results being
+# put to NetworkTables, kept as a histogram so the robot code and the
+# dashboard can see when the pipeline is falling behind.
+
+from collections import deque
+import numpy as np
+
+# upper edges of the histogram buckets in milliseconds, the last one catches everything slower
+BUCKETS = [5, 10, 20, 33, 50, 100, 200, float('inf')]
+
+
+class LatencyHistogram:
+
+    def __init__(self, window=300):
+        self.samples = deque(maxlen=window) # last few latencies in milliseconds
+
+    def add(self, latencyMs):
+        self.samples.append(latencyMs)
+
+    def percentile(self, p):
+        if not self.samples:
+            return -1
+        return float(np.percentile(self.samples, p))
+
+    def counts(self):
+        counts = [0]*len(BUCKETS)
+        for ms in self.samples:
+            for i, edge in enumerate(BUCKETS):
+                if ms <= edge:
+                    counts[i] += 1
+                    break
+        return counts
+
+    def publish(self, sd):
+        sd.putNumber('latencyP50', self.percentile(50))
+        sd.putNumber('latencyP95', self.percentile(95))
+        sd.putNumber('latencyMax', max(self.samples) if self.samples else -1)
+        sd.putNumberArray('latencyHist', self.counts())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+# Measures how long results take to get from the vision loop to the robot.
+# A NetworkTables server is started in a separate process as a stand-in
+# roboRIO, listening on localhost and timestamping every update it receives.
+# TrackTheTape is run on frames from a recording (looped), published the way
+# one of the modes below does it, and every put that changed a watched key is
+# timestamped too. Received values are matched to the puts by value, in order,
+# so updates that NetworkTables coalesced or dropped count as not delivered.
+# Both sides use time.monotonic, which is the same clock for every process on
+# the machine.
+#
+#   python3 ntBenchmark.py match.frc --mode keys packed --rate 30 60 0
+#
+# For each mode and rate it reports the updates sent and received per second,
+# how many were delivered and the publish to receive latency, then the
+# highest rate each mode kept up with. A rate of 0 runs the loop flat out.
+# Needs pynetworktables, numpy and OpenCV, no camera or robot.
+
+import argparse
+import contextlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+from networktables import NetworkTablesInstance
+
+from frameRecording import openRecording
+from scriptLoader import loadScript
+from visionResult import ResultTable
+from changeOnlyTable import ChangeOnlyTable
+from visionLog import log
+
+# mode -> (what it does, the keys watched on the robot)
+MODES = {
+    'keys': ("separate puts, sent on the periodic update", ['tape1', 'centerN']),
+    'keysFlush': ("separate puts, flushed every frame", ['tape1', 'centerN']),
+    'packed': ("one visionResult array, flushed every frame", ['visionResult']),
+    'changeOnly': ("separate puts through the deadbands, flushed every frame", ['tape1', 'centerN']),
+}
+
+
+# the robot: a NetworkTables server noting when each update arrives
+def robotLoop(port, updateRate, persistFile, ready, stop, conn):
+    inst = NetworkTablesInstance.create()
+    if updateRate:
+        inst.setUpdateRate(updateRate)
+    received = []
+    def changed(table, key, value, isNew):
+        received.append((time.monotonic(), key, value))
+    inst.getTable('SmartDashboard').addEntryListener(changed)
+    inst.startServer(persistFilename=persistFile, listenAddress='127.0.0.1', port=port)
+    ready.set()
+    stop.wait()
+    inst.stopServer()
+    conn.send(received)
+    conn.close()
+
+
+def valueKey(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(float(v) for v in value)
+    return value
+
+# a NetworkTables table that notes when each watched key is put with a new value
+class TimedTable:
+
+    def __init__(self, sd, keys):
+        self.sd = sd
+        self.keys = keys
+        self.sent = dict((key, []) for key in keys) # key -> [(time, value)]
+        self.last = {}
+
+    def getNumber(self, key, defaultValue):
+        return self.sd.getNumber(key, defaultValue)
+
+    def getNumberArray(self, key, defaultValue):
+        return self.sd.getNumberArray(key, defaultValue)
+
+    def getBoolean(self, key, defaultValue):
+        return self.sd.getBoolean(key, defaultValue)
+
+    def putNumber(self, key, value):
+        self.note(key, value)
+        return self.sd.putNumber(key, value)
+
+    def putNumberArray(self, key, value):
+        self.note(key, value)
+        return self.sd.putNumberArray(key, value)
+
+    def putBoolean(self, key, value):
+        self.note(key, value)
+        return self.sd.putBoolean(key, value)
+
+    # NetworkTables doesn't send a put of the value an entry already has
+    def note(self, key, value):
+        if key not in self.sent:
+            return
+        value = valueKey(value)
+        if self.last.get(key) != value:
+            self.last[key] = value
+            self.sent[key].append((time.monotonic(), value))
+
+# latencies in seconds of the received updates, each matched to the first put
+# of its value after the last one matched for that key
+def matchUpdates(sent, received):
+    latencies = []
+    matched = dict((key, 0) for key in sent)
+    for at, key, value in received:
+        updates = sent.get(key)
+        if updates is None:
+            continue
+        value = valueKey(value)
+        i = matched[key]
+        while i < len(updates) and updates[i][1] != value:
+            i += 1
+        if i == len(updates): # not something this run put, e.g. sent on connecting
+            continue
+        latencies.append(at - updates[i][0])
+        matched[key] = i + 1
+    return np.array(latencies)
+
+# returns publish(frame, seq, captureTime, frameTime) that detects and puts one
+# frame the way mode does, frameTime being when it was recorded in seconds
+def makePublisher(mode, script, timed, inst):
+    params = script.tapeParams.snapshot
+    if mode in ('keys', 'keysFlush'):
+        def publish(frame, seq, captureTime, frameTime):
+            script.TrackTheTape(frame, timed, params, frameTime)
+            if mode == 'keysFlush':
+                inst.flush()
+        return publish
+    if mode == 'packed':
+        results = ResultTable(timed, flush=inst.flush, separate=False)
+        publisher = None
+    else:
+        publisher = ChangeOnlyTable(timed, script.deadbands)
+        results = ResultTable(publisher, flush=inst.flush, separate=True)
+    def publish(frame, seq, captureTime, frameTime):
+        results.begin()
+        script.TrackTheTape(frame, results, params, frameTime)
+        results.publish(seq, captureTime)
+        if publisher is not None:
+            publisher.tick()
+    return publish
+
+def waitConnected(inst, timeout):
+    end = time.monotonic() + timeout
+    while not inst.isConnected():
+        if time.monotonic() > end:
+            raise RuntimeError("could not connect to the stand-in robot")
+        time.sleep(0.01)
+
+# one mode at one rate against a fresh robot, returns (sent, received, seconds, latencies)
+def runMode(script, records, mode, rate, seconds, port, updateRate, settle):
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Event()
+    stop = ctx.Event()
+    receiver, sender = ctx.Pipe(False)
+    persistFile = os.path.join(tempfile.gettempdir(), "ntBenchmark-{}.ini".format(port))
+    robot = ctx.Process(target=robotLoop, args=(port, updateRate, persistFile, ready, stop, sender), name="StandInRobot")
+    robot.start()
+    inst = None
+    try:
+        if not ready.wait(10):
+            raise RuntimeError("the stand-in robot did not start")
+        inst = NetworkTablesInstance.create()
+        if updateRate:
+            inst.setUpdateRate(updateRate)
+        inst.startClient([('127.0.0.1', port)])
+        waitConnected(inst, 5)
+        timed = TimedTable(inst.getTable('SmartDashboard'), MODES[mode][1])
+        publish = makePublisher(mode, script, timed, inst)
+        frame = np.empty_like(records[0]['frame'])
+        period = 1.0/rate if rate else 0.0
+        first = int(records[0]['time'])
+        span = (int(records[-1]['time']) - first)*len(records)/max(1, len(records) - 1) # so every loop carries on in time from the last
+        seq = 0
+        start = nextAt = time.monotonic()
+        while time.monotonic() - start < seconds:
+            if period:
+                wait = nextAt - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                nextAt = max(nextAt + period, time.monotonic() - period) # don't make up for a slow frame with a burst
+            loop, i = divmod(seq, len(records))
+            np.copyto(frame, records[i]['frame']) # the detector draws on the frame
+            # the tracker goes by the recording's frame times, so what is detected doesn't depend on the rate
+            publish(frame, seq, int(time.monotonic()*1e6), (int(records[i]['time']) - first + loop*span)/1e6)
+            seq += 1
+        elapsed = time.monotonic() - start
+        time.sleep(settle) # let the last updates arrive
+    finally:
+        stop.set()
+        received = receiver.recv() if robot.is_alive() or receiver.poll() else []
+        robot.join(5)
+        if inst is not None:
+            inst.stopClient()
+        if os.path.exists(persistFile):
+            os.remove(persistFile)
+    sent = sum(len(updates) for updates in timed.sent.values())
+    latencies = matchUpdates(timed.sent, received)
+    return sent, len(latencies), elapsed, latencies
+
+def report(mode, rate, sent, received, seconds, latencies):
+    ms = latencies*1000 if len(latencies) else np.array([np.nan])
+    print("%-10s %5s Hz   sent %7.1f/s   received %7.1f/s   delivered %5.1f%%   p50 %7.2f ms   p95 %7.2f ms   p99 %7.2f ms   max %7.2f ms" % (
+        mode, rate or 'max', sent/seconds, received/seconds, 100.0*received/max(1, sent),
+        np.percentile(ms, 50), np.percentile(ms, 95), np.percentile(ms, 99), np.max(ms)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure NetworkTables publish to receive latency against a local stand-in robot")
+    parser.add_argument('recording', help="frames to run TrackTheTape on, made with replay.py or recordFile")
+    parser.add_argument('--mode', choices=sorted(MODES), nargs='+', default=sorted(MODES))
+    parser.add_argument('--rate', type=float, nargs='+', default=[30, 60, 120, 0], help="frames per second to run the loop at, 0 for as fast as it goes")
+    parser.add_argument('--seconds', type=float, default=5.0, help="how long to run each mode at each rate")
+    parser.add_argument('--port', type=int, default=5810, help="first port for the stand-in robot, each run uses the next one")
+    parser.add_argument('--update-rate', dest='updateRate', type=float, help="NetworkTables periodic update interval in seconds (default the library's)")
+    parser.add_argument('--settle', type=float, default=0.5, help="seconds to wait for the last updates after each run")
+    parser.add_argument('--min-delivered', dest='minDelivered', type=float, default=95.0, help="percent of updates a rate has to deliver to count as kept up with")
+    parser.add_argument('--max-latency', dest='maxLatency', type=float, default=50.0, help="p95 latency in ms a rate has to stay under to count as kept up with")
+    args = parser.parse_args()
+    log.stream = sys.stderr # the log's writer thread would otherwise write into the report
+
+    records = openRecording(args.recording, 'r')
+    if len(records) == 0:
+        print("'{}' has no frames".format(args.recording))
+        return
+    script = loadScript('Vision Code.py')
+    for mode, (description, keys) in MODES.items():
+        if mode in args.mode:
+            print("%-10s %s, watching %s" % (mode, description, ", ".join(keys)))
+
+    port = args.port
+    kept = {}
+    for mode in args.mode:
+        for rate in args.rate:
+            script.roi.reset()
+            script.tracker.reset()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                sent, received, seconds, latencies = runMode(script, records, mode, rate, args.seconds, port, args.updateRate, args.settle)
+            port += 1
+            report(mode, rate, sent, received, seconds, latencies)
+            delivered = 100.0*received/max(1, sent)
+            if sent and delivered >= args.minDelivered and np.percentile(latencies*1000, 95) <= args.maxLatency:
+                kept[mode] = max(kept.get(mode, 0), sent/seconds)
+
+    print("")
+    for mode in args.mode:
+        if mode in kept:
+            print("%-10s kept up with %.1f updates/s" % (mode, kept[mode]))
+        else:
+            print("%-10s kept up with none of the rates tried" % mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# Dashboard parameters kept up to date by NetworkTables entry listeners
+# instead of a getNumber per key per frame. Every change builds a new
+# read-only snapshot and swaps it in, so the tracking loop just picks up
+# .snapshot with no NetworkTables lookup or lock and always sees one
+# consistent set of values. Anything worked out from the values (bound
+# tuples and so on) is made by derive() when they change, not per frame.
+#
+# Tables that can't be listened to (RecordingTable in the offline tools and
+# the worker processes) go through read() instead, which only rebuilds the
+# snapshot when a value is different.
+
+import os
+import threading
+from types import MappingProxyType
+
+from visionLog import log
+
+
+class ParameterCache:
+
+    def __init__(self, defaults, derive=None):
+        self.defaults = dict(defaults) # key -> default, the type of the default picks getNumber or getBoolean
+        self.derive = derive # values -> dict of extra entries for the snapshot
+        self.lock = threading.Lock()
+        self.values = dict(defaults)
+        self.snapshot = self.build(self.values)
+        self.listening = None # the table the listeners are on
+        self.changes = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.afterFork)
+
+    # a listener thread could hold the lock when a worker is forked and wouldn't be there to let it go
+    def afterFork(self):
+        self.lock = threading.Lock()
+
+    def build(self, values):
+        snapshot = dict(values)
+        if self.derive is not None:
+            snapshot.update(self.derive(snapshot))
+        return MappingProxyType(snapshot)
+
+    def listen(self, sd):
+        for key in self.defaults:
+            sd.addEntryListener(self.entryChanged, immediateNotify=True, key=key, localNotify=True)
+        self.listening = sd
+        return self
+
+    # called on the NetworkTables thread
+    def entryChanged(self, table, key, value, isNew):
+        self.set(key, value)
+
+    def set(self, key, value):
+        with self.lock:
+            if self.values.get(key) == value:
+                return
+            values = dict(self.values)
+            values[key] = value
+            self.update(values)
+
+    def update(self, values):
+        self.values = values
+        self.snapshot = self.build(values)
+        self.changes += 1
+
+    # the snapshot for sd, reading every key from it if it is not the table being listened to
+    # (forked workers inherit the listening cache but not the listener thread)
+    def read(self, sd):
+        if sd is self.listening:
+            return self.snapshot
+        try:
+            values = {}
+            for key, default in self.defaults.items():
+                if isinstance(default, bool):
+                    values[key] = sd.getBoolean(key, default)
+                else:
+                    values[key] = sd.getNumber(key, default)
+        except Exception as err:
+            log.warning('paramRead', "Unable to grab network table values, keeping the last ones: %s", err)
+            return self.snapshot
+        if values != self.values:
+            with self.lock:
+                self.update(values)
+        return self.snapshot
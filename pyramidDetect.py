@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Coarse-to-fine contour search for cameras running at more than the
+# detectors were tuned for. The frame is pyrDown'd until it is about
+# coarseWidth wide and thresholded there to find candidates. Only the crops
+# of the full resolution frame around those candidates are then thresholded
+# again and searched, so the contours (and the box corners and centers fitted
+# to them) keep full resolution precision for about the cost of a small
+# frame. Strips only a few pixels wide at the coarse level are blurred down
+# to a pixel or two there, so candidates are gated on the box they cover
+# rather than their area, and the threshold used at the coarse level can
+# leave out cleanup like erode that would wipe them out. When the coarse
+# frame had candidates but nothing big enough turns up in their crops the
+# whole frame is searched after all. A frame with no candidates at all, like
+# most frames in a match, costs only the coarse search.
+#
+# pyrDown smooths before halving, so noise and thin edges survive into the
+# coarse frame. With smooth=False the coarse frame is just every 2^levels-th
+# pixel, which is far cheaper but can miss strips only a few pixels wide.
+
+import numpy as np
+import cv2
+
+from framePool import getPool
+
+
+class PyramidDetector:
+
+    def __init__(self, coarseWidth=160, pad=2, smooth=True, enabled=True):
+        self.coarseWidth = coarseWidth # frames are halved while they stay at least this wide
+        self.pad = pad # coarse pixels added round each candidate
+        self.smooth = smooth # pyrDown, or nearest pixel when False
+        self.enabled = enabled
+        self.buffers = {} # pyrDown output for each level, by full frame size
+        self.crops = [] # (x0, y0, x1, y1) searched in the last frame
+        self.fullSearches = 0 # frames where the crops found nothing and the whole frame was searched
+
+    def levels(self, width):
+        levels = 0
+        while width//2 >= self.coarseWidth:
+            width //= 2
+            levels += 1
+        return levels
+
+    # True when frames this wide would be searched coarse-to-fine
+    def active(self, width):
+        return self.enabled and self.levels(width) > 0
+
+    def pyrDown(self, frame, levels):
+        key = frame.shape
+        if key not in self.buffers:
+            buffers = []
+            height, width = frame.shape[:2]
+            for level in range(levels):
+                height, width = (height + 1)//2, (width + 1)//2
+                buffers.append(np.empty(shape=(height, width, 3), dtype=np.uint8))
+            self.buffers[key] = buffers
+        buffers = self.buffers[key]
+        if not self.smooth:
+            coarse = buffers[-1]
+            return cv2.resize(frame, (coarse.shape[1], coarse.shape[0]), coarse, interpolation=cv2.INTER_NEAREST)
+        image = frame
+        for buf in buffers:
+            image = cv2.pyrDown(image, buf)
+        return image
+
+    # windows of the full frame around every candidate big enough at the
+    # coarse level, overlapping windows merged so no contour is found twice
+    def candidates(self, frame, threshold, minArea):
+        levels = self.levels(frame.shape[1])
+        scale = 2**levels
+        coarse = self.pyrDown(frame, levels)
+        pool = getPool(coarse.shape[1], coarse.shape[0])
+        mask = threshold(coarse, pool.hsv, pool.mask, pool.scratch)
+        a, cnts, b = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        height, width = frame.shape[:2]
+        crops = []
+        for c in cnts:
+            x, y, w, h = cv2.boundingRect(c)
+            if w*h < minArea/scale**2/2: # small strips blur to a pixel or two, so not their area
+                continue
+            crops.append([max(0, (x - self.pad)*scale), max(0, (y - self.pad)*scale),
+                          min(width, (x + w + self.pad)*scale), min(height, (y + h + self.pad)*scale)])
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(crops)):
+                for j in range(i + 1, len(crops)):
+                    p, q = crops[i], crops[j]
+                    if p[0] < q[2] and q[0] < p[2] and p[1] < q[3] and q[1] < p[3]:
+                        crops[i] = [min(p[0], q[0]), min(p[1], q[1]), max(p[2], q[2]), max(p[3], q[3])]
+                        del crops[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return [tuple(crop) for crop in crops]
+
+    # Contours in full frame coordinates, like findContours on the whole frame
+    # would give but only inside the crops. threshold(image, hsvBuf, maskBuf,
+    # scratchBuf) must fill maskBuf from image and return it, pool holds the
+    # full resolution buffers. coarseThreshold is used on the coarse frame
+    # instead when given.
+    def findContours(self, frame, threshold, minArea, pool, coarseThreshold=None):
+        self.crops = self.candidates(frame, coarseThreshold or threshold, minArea)
+        cnts = []
+        for x0, y0, x1, y1 in self.crops:
+            mask = threshold(frame[y0:y1, x0:x1], pool.hsv[y0:y1, x0:x1], pool.mask[y0:y1, x0:x1], pool.scratch[y0:y1, x0:x1])
+            a, found, b = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE, offset=(x0, y0))
+            cnts.extend(found)
+        if self.crops and not any(cv2.contourArea(c) >= minArea for c in cnts): # something there, but not where the coarse frame put it
+            self.fullSearches += 1
+            height, width = frame.shape[:2]
+            self.crops = [(0, 0, width, height)]
+            mask = threshold(frame, pool.hsv, pool.mask, pool.scratch)
+            a, cnts, b = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        return cnts
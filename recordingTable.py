@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# Stand-in for a NetworkTables table. Reads come from a plain dict of values
+# and every put is recorded in order so it can be looked at or replayed onto
+# the real table later.
+
+
+class RecordingTable:
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.puts = []
+
+    def getNumber(self, key, defaultValue):
+        return self.values.get(key, defaultValue)
+
+    def getNumberArray(self, key, defaultValue):
+        return self.values.get(key, defaultValue)
+
+    def getBoolean(self, key, defaultValue):
+        return self.values.get(key, defaultValue)
+
+    def putNumber(self, key, value):
+        self.put('putNumber', key, value)
+
+    def putNumberArray(self, key, value):
+        self.put('putNumberArray', key, list(value))
+
+    def putBoolean(self, key, value):
+        self.put('putBoolean', key, value)
+
+    def put(self, method, key, value):
+        self.values[key] = value
+        self.puts.append((method, key, value))
+        return True
+
+    def clear(self):
+        self.puts = []
+
+    # writes the recorded puts onto a real table in the order they were made
+    def replay(self, sd):
+        for method, key, value in self.puts:
+            getattr(sd, method)(key, value)
+
+
+# Passes reads and puts straight through to a real table, recording the puts
+# on the way so they can be replayed again later.
+class ForwardingTable(RecordingTable):
+
+    def __init__(self, sd):
+        RecordingTable.__init__(self)
+        self.sd = sd
+
+    def getNumber(self, key, defaultValue):
+        return self.sd.getNumber(key, defaultValue)
+
+    def getNumberArray(self, key, defaultValue):
+        return self.sd.getNumberArray(key, defaultValue)
+
+    def getBoolean(self, key, defaultValue):
+        return self.sd.getBoolean(key, defaultValue)
+
+    def put(self, method, key, value):
+        RecordingTable.put(self, method, key, value)
+        return getattr(self.sd, method)(key, value)
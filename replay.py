@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Replays a frame recording through one of the detectors as fast as it will
+# go. Frames are used straight out of the memory mapped recording, reports
+# fps and writes what the detector found for every frame as JSON lines.
+#
+#   python3 replay.py play match.frc --detector tape --out detections.jsonl
+#   python3 replay.py convert match.avi match.frc
+#
+# Recordings are made by setting recordFile in Vision Code.py, or converted
+# from any video OpenCV can read.
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+from frameRecording import FrameRecorder, openRecording
+from recordingTable import RecordingTable
+from scriptLoader import loadScript
+from visionLog import log
+
+# HSV bounds handed to the detectors that read them from NetworkTables
+TAPE_HSV = {'HL': 0, 'HU': 57, 'SL': 0, 'SU': 167, 'VL': 94, 'VU': 255}
+BALL_HSV = {'HL': 19, 'HU': 41, 'SL': 237, 'SU': 255, 'VL': 67, 'VU': 135}
+
+
+def jsonValue(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [jsonValue(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    return value
+
+# Each detector is set up as a function taking a frame and the time in seconds
+# it was recorded at and returning a dict of what it found, so they can all be
+# timed and written out the same way.
+def tapeDetector(values):
+    TrackTheTape = loadScript('Vision Code.py').TrackTheTape
+    table = RecordingTable(values)
+    def detect(frame, frameTime):
+        table.clear()
+        TrackTheTape(frame, table, grabbedAt=frameTime) # the tracker goes by the recording, not how fast it replays
+        return dict((key, value) for method, key, value in table.puts)
+    return detect
+
+def ballDetector(values):
+    TrackTheBall = loadScript('Ball_Detection_Vision_Code .py').TrackTheBall
+    table = RecordingTable(values)
+    def detect(frame, frameTime):
+        table.clear()
+        TrackTheBall(frame, table)
+        return dict((key, value) for method, key, value in table.puts)
+    return detect
+
+def rfactorDetector(values):
+    visionFun = loadScript(os.path.join('Example Codes', 'RFactor Code.py')).visionFun
+    def detect(frame, frameTime):
+        result = visionFun(frame)
+        if result is None:
+            return {'x': -1, 'y': -1}
+        image, coord = result
+        return {'x': coord[0], 'y': coord[1]}
+    return detect
+
+def gripDetector(values):
+    pipeline = loadScript(os.path.join('Example Codes', 'python-multiCameraServer', 'multiCameraServer.py')).GripPipeline()
+    def detect(frame, frameTime):
+        pipeline.process(frame)
+        return {'blobs': [[k.pt[0], k.pt[1], k.size] for k in pipeline.find_blobs_output]}
+    return detect
+
+DETECTORS = {
+    'tape': (tapeDetector, TAPE_HSV),
+    'ball': (ballDetector, BALL_HSV),
+    'rfactor': (rfactorDetector, {}),
+    'grip': (gripDetector, {}),
+}
+
+
+def play(args):
+    records = openRecording(args.recording, 'r' if args.readonly else 'c')
+    if len(records) == 0:
+        print("'{}' has no frames".format(args.recording))
+        return
+    makeDetector, values = DETECTORS[args.detector]
+    detect = makeDetector(values)
+    out = open(args.out, 'w') if args.out else None
+    times = []
+    first, last = int(records[0]['time']), int(records[-1]['time'])
+    span = (last - first)*len(records)/max(1, len(records) - 1) # so every loop carries on in time from the last
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull if args.quiet else sys.stdout):
+        for loop in range(args.loops):
+            for i in range(len(records)):
+                frame = records[i]['frame']
+                frameTime = (int(records[i]['time']) - first + loop*span)/1e6
+                start = time.perf_counter()
+                found = detect(frame, frameTime)
+                times.append(time.perf_counter() - start)
+                if out is not None and loop == 0:
+                    line = {'index': i, 'time': int(records[i]['time'])}
+                    for key, value in found.items():
+                        line[key] = jsonValue(value)
+                    out.write(json.dumps(line) + "\n")
+    if out is not None:
+        out.close()
+
+    ms = np.array(times)*1000
+    height, width = records[0]['frame'].shape[:2]
+    print("%s on %d %dx%d frames: %.1f fps   mean %.3f ms   p50 %.3f ms   p95 %.3f ms   max %.3f ms" % (
+        args.detector, len(times), width, height, len(times)/(ms.sum()/1000), ms.mean(), np.percentile(ms, 50), np.percentile(ms, 95), ms.max()))
+
+def convert(args):
+    capture = cv2.VideoCapture(args.video)
+    recorder = None
+    frameTime = 0
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        if recorder is None:
+            recorder = FrameRecorder(args.recording, frame.shape[1], frame.shape[0])
+        frameTime = int(capture.get(cv2.CAP_PROP_POS_MSEC)*1000) or frameTime + 1
+        recorder.write(frameTime, frame)
+    if recorder is None:
+        print("could not read any frames from '{}'".format(args.video))
+        return
+    recorder.close()
+    print("wrote {} frames to '{}'".format(recorder.count, args.recording))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded frames through the vision detectors")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    p = commands.add_parser('play', help="run a recording through a detector")
+    p.add_argument('recording')
+    p.add_argument('--detector', choices=sorted(DETECTORS), default='tape')
+    p.add_argument('--out', help="write the detections for each frame to this JSON lines file")
+    p.add_argument('--loops', type=int, default=1, help="times to go through the recording")
+    p.add_argument('--readonly', action='store_true', help="map the frames read only, for detectors that don't draw")
+    p.add_argument('--quiet', action='store_true', help="hide what the detectors print and log")
+    p.set_defaults(run=play)
+
+    p = commands.add_parser('convert', help="turn a video file into a recording")
+    p.add_argument('video')
+    p.add_argument('recording')
+    p.set_defaults(run=convert)
+
+    args = parser.parse_args()
+    log.stream = sys.stderr # keep the detectors' log out of the report
+    log.enabled = not getattr(args, 'quiet', False)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# Keeps track of where the tape was last seen so the next frame only needs to
+# be searched in a window around it. The window is the box around the last
+# tape boxes padded by a multiple of the tape size (the square root of
+# avgArea). Every frame the tape is missed the padding grows, and after
+# maxMisses misses in a row it goes back to searching the whole frame. Only
+# full targets are passed to found(); a frame with one tape counts as a miss,
+# so the window keeps growing towards where the other tape should be.
+#
+# Every fullEvery frames the whole frame is searched anyway, so other targets
+# that came into view are still seen and the nearest one can take over.
+
+import math
+import numpy as np
+
+
+class RoiTracker:
+
+    def __init__(self, margin=1.5, growth=1.5, maxMisses=4, fullEvery=5, enabled=True):
+        self.margin = margin # padding around the last boxes, in tape sizes
+        self.growth = growth # padding is multiplied by this on every miss
+        self.maxMisses = maxMisses
+        self.fullEvery = fullEvery # search the whole frame at least this often, 0 for never
+        self.frames = 0
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.last = None # (x0, y0, x1, y1) around the last tape boxes
+        self.size = 0.0
+        self.misses = 0
+
+    # (x0, y0, x1, y1) to search in the next frame, or None for the whole frame
+    def window(self, width, height):
+        if not self.enabled or self.last is None:
+            return None
+        self.frames += 1
+        if self.fullEvery and self.frames % self.fullEvery == 0:
+            return None
+        pad = self.margin*self.size*self.growth**self.misses
+        x0, y0, x1, y1 = self.last
+        x0 = max(0, int(x0 - pad))
+        y0 = max(0, int(y0 - pad))
+        x1 = min(width, int(math.ceil(x1 + pad)))
+        y1 = min(height, int(math.ceil(y1 + pad)))
+        if x1 - x0 >= width and y1 - y0 >= height:
+            return None
+        return x0, y0, x1, y1
+
+    def found(self, boxes, avgArea):
+        points = np.concatenate([np.asarray(box).reshape(-1, 2) for box in boxes])
+        x0, y0 = points.min(axis=0)
+        x1, y1 = points.max(axis=0)
+        self.last = (x0, y0, x1, y1)
+        self.size = math.sqrt(max(avgArea, 1))
+        self.misses = 0
+
+    def missed(self):
+        if self.last is None:
+            return
+        self.misses += 1
+        if self.misses > self.maxMisses:
+            self.reset()
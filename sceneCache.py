@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# Skips detection when the camera is looking at the same thing as last time,
+# e.g. pre-match, disabled or sitting lined up at the cargo ship. Every frame
+# is shrunk to a thumbnail (INTER_AREA averages each block, which also evens
+# out sensor noise) and compared with the thumbnail of the last frame that was
+# detected. If no thumbnail pixel moved by more than threshold the detector's
+# puts and overlay from then are reused. Detection runs at least every maxAge
+# seconds however still the scene is.
+
+import cv2
+import numpy as np
+
+from recordingTable import ForwardingTable
+
+
+class SceneCache:
+
+    def __init__(self, size=(20, 15), threshold=6, maxAge=1.0, enabled=True):
+        self.size = size # (width, height) of the thumbnails
+        self.threshold = threshold # largest change in any thumbnail pixel still counted as the same scene
+        self.maxAge = maxAge
+        self.enabled = enabled
+        self.thumb = np.zeros(shape=(size[1], size[0], 3), dtype=np.uint8)
+        self.reference = np.zeros_like(self.thumb) # thumbnail of the last detected frame
+        self.diff = np.zeros_like(self.thumb)
+        self.valid = False
+        self.detectedAt = 0.0
+        self.overlay = None # the last detected frame with what was found drawn on it
+        self.table = None
+        self.hits = 0 # since the last publish
+        self.lookups = 0
+
+    # True if the last result can be used for this frame
+    def unchanged(self, frame, now):
+        if not self.enabled:
+            return False
+        self.lookups += 1
+        cv2.resize(frame, self.size, self.thumb, interpolation=cv2.INTER_AREA)
+        if not self.valid or now - self.detectedAt > self.maxAge or frame.shape != self.overlay.shape:
+            return False
+        cv2.absdiff(self.thumb, self.reference, self.diff)
+        if self.diff.max() > self.threshold:
+            return False
+        self.hits += 1
+        return True
+
+    # a table for the detector to put its results through, so they can be reused
+    def begin(self, sd):
+        if self.table is None or self.table.sd is not sd:
+            self.table = ForwardingTable(sd)
+        self.table.clear()
+        return self.table
+
+    # keeps the result of detecting the frame unchanged() last looked at
+    def store(self, frame, now):
+        if not self.enabled:
+            return
+        np.copyto(self.reference, self.thumb)
+        if self.overlay is None or self.overlay.shape != frame.shape:
+            self.overlay = np.empty_like(frame)
+        np.copyto(self.overlay, frame)
+        self.detectedAt = now
+        self.valid = True
+
+    # puts the last result again and draws its overlay into frame
+    def replay(self, frame, sd):
+        self.table.replay(sd)
+        np.copyto(frame, self.overlay)
+        return frame
+
+    def publish(self, sd):
+        sd.putNumber('sceneCacheHitRate', self.hits/max(1, self.lookups))
+        self.hits = 0
+        self.lookups = 0
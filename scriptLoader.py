@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+# Loads one of the vision scripts as a module so its detector functions can be
+# run offline. The script names have spaces and brackets in them so they
+# can't be imported the normal way.
+
+import importlib.util
+import os
+import sys
+
+root = os.path.dirname(os.path.abspath(__file__))
+
+# the scripts import our helper modules by name
+if root not in sys.path:
+    sys.path.insert(0, root)
+
+
+def loadScript(path, name=None):
+    if not os.path.isabs(path):
+        path = os.path.join(root, path)
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0].replace(' ', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# Times the stages of a detector. Call start() at the top of the frame and
+# lap(name) after each stage; each lap is the time since the previous one.
+# Keeps a rolling window per stage for p50/p95/p99, publishes them about once
+# a second and dumps everything on SIGUSR1. When disabled start() and lap()
+# return straight away.
+
+from collections import deque, OrderedDict
+import signal
+import time
+import numpy as np
+
+
+class StageTimer:
+
+    def __init__(self, enabled=False, window=300, publishPeriod=1.0):
+        self.enabled = enabled
+        self.window = window
+        self.publishPeriod = publishPeriod
+        self.stages = OrderedDict() # stage name -> deque of seconds
+        self.last = 0.0
+        self.lastPublish = 0.0
+
+    def start(self):
+        if not self.enabled:
+            return
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        samples = self.stages.get(stage)
+        if samples is None:
+            samples = self.stages[stage] = deque(maxlen=self.window)
+        samples.append(now - self.last)
+        self.last = now
+
+    # [p50, p95, p99] in milliseconds
+    def percentiles(self, stage):
+        return [float(x)*1000 for x in np.percentile(self.stages[stage], [50, 95, 99])]
+
+    # puts [p50, p95, p99] for every stage into table, at most once per publishPeriod
+    def publish(self, table):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self.lastPublish < self.publishPeriod:
+            return
+        self.lastPublish = now
+        for stage in list(self.stages):
+            table.putNumberArray(stage, self.percentiles(stage))
+
+    def dump(self):
+        print("stage               count    p50 ms    p95 ms    p99 ms")
+        for stage in list(self.stages):
+            p50, p95, p99 = self.percentiles(stage)
+            print("%-18s %6d %9.3f %9.3f %9.3f" % (stage, len(self.stages[stage]), p50, p95, p99))
+
+    def dumpOnSignal(self, signum=signal.SIGUSR1):
+        signal.signal(signum, lambda sig, frame: self.dump())
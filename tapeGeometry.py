@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Geometry of many tape boxes at once. Boxes are an (N, 4, 2) array of
+# corners in the order boxPoints gives them, and every function works on all
+# N in one go instead of looping over boxes and corners in Python.
+#
+# Slopes are given as the angle of the long side in degrees, in (-90, 90]
+# with y going down, so a vertical side is 90 instead of a division by zero.
+# A "/" strip has a negative angle and a "\" strip a positive one.
+
+import numpy as np
+
+
+# the corners cv2.boxPoints would give for each (cx, cy, width, height, angle)
+def boxesOf(cx, cy, width, height, angle):
+    theta = np.radians(angle)
+    a = np.sin(theta)*0.5
+    b = np.cos(theta)*0.5
+    boxes = np.empty(shape=(len(cx), 4, 2), dtype=np.float64)
+    boxes[:, 0, 0] = cx - a*height - b*width
+    boxes[:, 0, 1] = cy + b*height - a*width
+    boxes[:, 1, 0] = cx + a*height - b*width
+    boxes[:, 1, 1] = cy - b*height - a*width
+    boxes[:, 2] = 2*np.column_stack((cx, cy)) - boxes[:, 0]
+    boxes[:, 3] = 2*np.column_stack((cx, cy)) - boxes[:, 1]
+    return boxes
+
+def boxCenters(boxes):
+    return np.asarray(boxes, dtype=np.float64).mean(axis=1)
+
+# (N, 4) lengths of the sides from corner 0 to 1, 1 to 2, 2 to 3 and 3 to 0
+def sideLengths(boxes):
+    boxes = np.asarray(boxes, dtype=np.float64)
+    sides = np.roll(boxes, -1, axis=1) - boxes
+    return np.hypot(sides[..., 0], sides[..., 1])
+
+def longSideAngles(boxes, sides=None):
+    boxes = np.asarray(boxes, dtype=np.float64)
+    if sides is None:
+        sides = sideLengths(boxes)
+    first = boxes[:, 1] - boxes[:, 0]
+    second = boxes[:, 2] - boxes[:, 1]
+    edge = np.where((sides[:, 0] >= sides[:, 1])[:, None], first, second)
+    return foldAngle(np.degrees(np.arctan2(edge[:, 1], edge[:, 0])))
+
+# any angle of a line in degrees to the same line's angle in (-90, 90]
+def foldAngle(angle):
+    return 90 - (90 - angle) % 180
+
+# long side over short side, always >= 1
+def boxRatios(boxes, sides=None):
+    if sides is None:
+        sides = sideLengths(boxes)
+    longSide = np.maximum(sides[:, 0], sides[:, 1])
+    shortSide = np.minimum(sides[:, 0], sides[:, 1])
+    return longSide/np.maximum(shortSide, 1e-6)
+
+# centers, long side angles, ratios and side lengths of every box
+def boxGeometry(boxes):
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4, 2)
+    sides = sideLengths(boxes)
+    return boxCenters(boxes), longSideAngles(boxes, sides), boxRatios(boxes, sides), sides
+
+# distance between each pair of points in a and b, both (N, 2) or (2,)
+def pointDistances(a, b):
+    d = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    return np.hypot(d[..., 0], d[..., 1])
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+# Pairs up tape strips into 2019 vision targets. Each target is two strips
+# leaning towards each other at the top, "/ \". Strips are sorted by x and
+# labelled by which way they lean, then every left-leaning "/" strip with a
+# right-leaning "\" strip next to it on its right is a target. Sorting makes
+# it O(n log n) however many strips are in view.
+#
+# Tilts are in image coordinates where y goes down, so a "/" strip has a
+# negative tilt and a "\" strip a positive one.
+
+import numpy as np
+
+TARGETS = np.dtype([
+    ('left', np.int32), # rows of the "/" and "\" strips in the feature table
+    ('right', np.int32),
+    ('cx', np.float64), # middle of the two strip centers
+    ('cy', np.float64),
+    ('area', np.float64), # average area of the two strips
+    ('offset', np.float64), # distance of cx from the middle of the image
+])
+
+
+# "/" strips, the left one of a target
+def leansRight(features):
+    return features['tilt'] < 0
+
+# Returns every target found in the feature table, the one nearest the middle
+# of the image first. Strips whose areas differ by more than maxAreaRatio
+# are not paired, they are most likely from different targets.
+def findTargets(features, frameWidth, maxAreaRatio=3.0):
+    if len(features) < 2:
+        return np.zeros(0, dtype=TARGETS)
+    order = np.argsort(features['cx'], kind='stable')
+    left = leansRight(features)[order]
+    area = features['area'][order]
+
+    # a "/" followed directly by a "\" is a pair
+    starts = np.nonzero(left[:-1] & ~left[1:])[0]
+    ratio = np.maximum(area[starts], area[starts + 1])/np.maximum(np.minimum(area[starts], area[starts + 1]), 1e-6)
+    starts = starts[ratio <= maxAreaRatio]
+
+    targets = np.zeros(len(starts), dtype=TARGETS)
+    targets['left'] = order[starts]
+    targets['right'] = order[starts + 1]
+    l = features[targets['left']]
+    r = features[targets['right']]
+    targets['cx'] = (l['cx'] + r['cx'])/2
+    targets['cy'] = (l['cy'] + r['cy'])/2
+    targets['area'] = (l['area'] + r['area'])/2
+    targets['offset'] = np.abs(targets['cx'] - frameWidth/2)
+    return targets[np.argsort(targets['offset'], kind='stable')]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Runs a detector like TrackTheTape in several worker processes so every core
+# on the Pi gets used. Frames live in a ring of slots in shared memory: the
+# camera grabs straight into a free slot and only the slot number is sent to
+# a worker, so frames are never pickled or copied between processes. Workers
+# record their NetworkTables puts and the results are handed back in frame
+# order.
+#
+# A worker that dies is started again and the frame it had is skipped. A
+# frame that hasn't come back after timeout seconds (a stuck worker) is
+# skipped too, so one lost frame can't hold up every result behind it. Each
+# worker sends its results down its own pipe rather than a Queue, whose feeder
+# thread would take already finished results down with a worker that dies.
+
+import multiprocessing
+import multiprocessing.connection
+import time
+import numpy as np
+
+from recordingTable import RecordingTable
+from visionLog import log
+
+
+def workerLoop(detector, shared, shape, jobs, results, current, index):
+    frames = np.frombuffer(shared, dtype=np.uint8).reshape(shape)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        slot, seq, params = job
+        current[index] = seq # so the pool knows which frame was lost if this process dies
+        table = RecordingTable(params)
+        try:
+            detector(frames[slot], table)
+        except Exception as e:
+            log.error('workerFailed', "worker failed on frame %s: %s", seq, e)
+        current[index] = -1
+        results.send((seq, slot, table.puts))
+
+
+class TapeWorkerPool:
+
+    def __init__(self, detector, width, height, numWorkers=4, numSlots=None, timeout=1.0):
+        if numSlots is None:
+            numSlots = numWorkers*2 # enough for every worker to be busy with one queued behind it
+        self.detector = detector
+        self.shape = (numSlots, height, width, 3)
+        self.timeout = timeout # seconds to wait for a frame before skipping it
+        # workers are forked so the detector function does not need to be picklable
+        self.ctx = multiprocessing.get_context('fork')
+        self.shared = self.ctx.RawArray('B', numSlots*height*width*3)
+        self.frames = np.frombuffer(self.shared, dtype=np.uint8).reshape(self.shape)
+        self.jobs = self.ctx.Queue()
+        self.current = self.ctx.RawArray('q', [-1]*numWorkers) # frame each worker is on, -1 when idle
+        self.free = list(range(numSlots))
+        self.pending = {} # finished results waiting for an earlier frame
+        self.submitted = {} # seq -> (slot, time.monotonic() it was submitted) until it comes back
+        self.lost = set() # frames a dead worker had, skipped as soon as they are next
+        self.abandoned = {} # seq -> slot of frames skipped while a worker may still be using the slot
+        self.skipped = 0
+        self.restarts = 0
+        self.nextSeq = 0 # next sequence number handed out by submit
+        self.nextResult = 0 # next sequence number to hand back
+
+        self.workers = [None]*numWorkers
+        self.results = [None]*numWorkers # the end of each worker's pipe results are read from
+        for i in range(numWorkers):
+            self.startWorker(i)
+
+    def startWorker(self, index):
+        receiver, sender = self.ctx.Pipe(False)
+        p = self.ctx.Process(target=workerLoop, args=(self.detector, self.shared, self.shape, self.jobs, sender, self.current, index), name="TapeWorker{}".format(index))
+        p.daemon = True
+        p.start()
+        sender.close() # only the worker writes to it, so reading gets EOF once the worker is gone
+        self.workers[index] = p
+        self.results[index] = receiver
+
+    # starts a worker again in place of any that died, the frame it had is lost
+    def checkWorkers(self):
+        for i, p in enumerate(self.workers):
+            if p.is_alive():
+                continue
+            self.drain() # anything it sent before it went
+            self.results[i].close()
+            seq = self.current[i]
+            log.error('workerDied', "tape worker %d died with exit code %s on frame %s", i, p.exitcode, seq)
+            self.current[i] = -1
+            if seq in self.abandoned: # already skipped, nothing is using its slot now
+                self.release(self.abandoned.pop(seq))
+            elif seq >= self.nextResult:
+                self.lost.add(seq)
+            self.startWorker(i)
+            self.restarts += 1
+
+    # Returns a free slot number, or None if every slot is in use. When the
+    # ring is full this waits up to timeout for a worker to finish so the
+    # caller can hand back results and release slots.
+    def freeSlot(self, timeout=1.0):
+        if self.free:
+            return self.free.pop()
+        self.drain(timeout)
+        return None
+
+    def submit(self, slot, params=None):
+        seq = self.nextSeq
+        self.nextSeq += 1
+        self.submitted[seq] = (slot, time.monotonic())
+        self.jobs.put((slot, seq, params))
+        return seq
+
+    def release(self, slot):
+        self.free.append(slot)
+
+    def drain(self, timeout=None):
+        readers = [conn for conn in self.results if not conn.closed]
+        ready = multiprocessing.connection.wait(readers, timeout or 0)
+        while ready:
+            for conn in ready:
+                try:
+                    seq, slot, puts = conn.recv()
+                except (EOFError, OSError): # worker gone, checkWorkers starts another
+                    readers.remove(conn)
+                    continue
+                if seq in self.abandoned: # came back after it was skipped
+                    self.release(self.abandoned.pop(seq))
+                else:
+                    self.pending[seq] = (slot, puts)
+            ready = multiprocessing.connection.wait(readers, 0) # only block for the first one
+
+    # Yields (seq, slot, frame, puts) for every finished frame that is next in
+    # sequence. The slot must be given back with release() once the frame has
+    # been used. Skipped frames are never yielded, so a seq can be missing.
+    def finished(self):
+        self.drain()
+        self.checkWorkers()
+        now = time.monotonic()
+        while self.nextResult < self.nextSeq:
+            seq = self.nextResult
+            if seq in self.pending:
+                slot, puts = self.pending.pop(seq)
+                del self.submitted[seq]
+                yield seq, slot, self.frames[slot], puts
+            elif seq in self.lost: # its worker died, nothing is using the slot
+                self.lost.discard(seq)
+                self.release(self.submitted.pop(seq)[0])
+                self.skipped += 1
+            elif now - self.submitted[seq][1] > self.timeout: # stuck, the slot is freed if it ever comes back
+                self.abandoned[seq] = self.submitted.pop(seq)[0]
+                self.skipped += 1
+                log.warning('workerTimeout', "skipped frame %s after %.1f s without a result", seq, self.timeout)
+            else:
+                break
+            self.nextResult += 1
+
+    def close(self):
+        for p in self.workers:
+            self.jobs.put(None)
+        for p in self.workers:
+            p.join()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Full pose of a 2019 vision target from the eight corners of its two tape
+# strips. The corners are fitted to the real target with solvePnP, which
+# gives how far away the target is, which way it is from the camera and how
+# far round it is turned, instead of guessing the range from the tape width.
+#
+# Camera intrinsics are worked out once per video mode, from the field of
+# view unless a calibration has been given with setIntrinsics. Each solve
+# starts from the last frame's pose, so it only has to move it a little. If
+# the corners have jumped too far for that to land on them (the fit is off
+# by more than maxError pixels) it is solved again from scratch.
+
+import math
+import numpy as np
+import cv2
+
+TAPE_WIDTH = 2.0 # inches
+TAPE_LENGTH = 5.5
+TAPE_ANGLE = 14.5 # degrees each strip leans towards the other at the top
+TAPE_GAP = 8.0 # inches between the strips at their closest point
+FOV = 60 # horizontal field of view of the camera in degrees
+
+
+# corners of the left "/" and right "\" strips in inches from the middle of
+# the target, x right and y down like the image, in the order orderCorners
+# puts image corners in
+def targetModel():
+    theta = math.radians(TAPE_ANGLE)
+    half = TAPE_GAP/2 + math.sin(theta)*TAPE_LENGTH/2 + math.cos(theta)*TAPE_WIDTH/2
+    strips = []
+    for side, lean in ((-1, theta), (1, -theta)):
+        up = np.array([math.sin(lean), -math.cos(lean)])*TAPE_LENGTH/2
+        across = np.array([math.cos(lean), math.sin(lean)])*TAPE_WIDTH/2
+        center = np.array([side*half, 0.0])
+        strips.append([center + up - across, center + up + across, center - up + across, center - up - across])
+    corners = orderCorners(np.array(strips)).reshape(-1, 2)
+    return np.column_stack((corners, np.zeros(len(corners)))).astype(np.float64)
+
+# puts the corners of each (4, 2) box in the same order, starting from the top
+# one and going clockwise on the screen
+def orderCorners(boxes):
+    boxes = np.asarray(boxes, dtype=np.float64)
+    centers = boxes.mean(axis=1, keepdims=True)
+    angles = np.arctan2(boxes[..., 1] - centers[..., 1], boxes[..., 0] - centers[..., 0])
+    top = np.argmin(boxes[..., 1], axis=1)
+    start = angles[np.arange(len(boxes)), top][:, None]
+    order = np.argsort((angles - start) % (2*math.pi), axis=1)
+    return np.take_along_axis(boxes, order[..., None], axis=1)
+
+MODEL = targetModel()
+
+intrinsics = {} # (width, height) -> (camera matrix, distortion)
+
+def setIntrinsics(width, height, cameraMatrix, distortion=None):
+    intrinsics[(width, height)] = (np.asarray(cameraMatrix, dtype=np.float64),
+                                   np.zeros(5) if distortion is None else np.asarray(distortion, dtype=np.float64))
+
+def getIntrinsics(width, height, fov=FOV):
+    key = (width, height)
+    if key not in intrinsics:
+        f = (width/2)/math.tan(math.radians(fov/2))
+        setIntrinsics(width, height, [[f, 0, (width - 1)/2], [0, f, (height - 1)/2], [0, 0, 1]])
+    return intrinsics[key]
+
+
+class PoseEstimator:
+
+    def __init__(self, fov=FOV, iterations=5, maxError=2.0, enabled=True):
+        self.fov = fov
+        self.iterations = iterations # refine steps when starting from the last pose
+        self.maxError = maxError # rms pixels a warm started fit may be off by
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.rvec = None # last pose, the start of the next solve
+        self.tvec = None
+        self.warmMisses = 0 # warm starts that had to be solved again from scratch
+
+    def refine(self, corners, cameraMatrix, distortion):
+        rvec, tvec = self.rvec.copy(), self.tvec.copy()
+        if hasattr(cv2, 'solvePnPRefineLM'): # OpenCV 4.1 and up
+            cv2.solvePnPRefineLM(MODEL, corners, cameraMatrix, distortion, rvec, tvec,
+                                 (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, self.iterations, 1e-6))
+            return True, rvec, tvec
+        return cv2.solvePnP(MODEL, corners, cameraMatrix, distortion, rvec, tvec, True)
+
+    # rms distance in pixels between the corners and the model seen from this pose
+    def error(self, corners, rvec, tvec, cameraMatrix, distortion):
+        projected = cv2.projectPoints(MODEL, rvec, tvec, cameraMatrix, distortion)[0]
+        return math.sqrt(np.mean(np.sum((projected - corners)**2, axis=2)))
+
+    # boxes are the (2, 4, 2) corners of the left and right strips. Returns
+    # (distance, yaw, skew) or None if there is no sensible pose:
+    #   distance  inches along the floor from the camera to the target
+    #   yaw       degrees from straight ahead to the target, positive to the right
+    #   skew      degrees the target is turned round from facing the camera
+    def solve(self, boxes, width, height):
+        if not self.enabled:
+            return None
+        cameraMatrix, distortion = getIntrinsics(width, height, self.fov)
+        corners = orderCorners(boxes).reshape(-1, 1, 2)
+        ok = False
+        if self.rvec is not None:
+            ok, rvec, tvec = self.refine(corners, cameraMatrix, distortion)
+            ok = ok and self.error(corners, rvec, tvec, cameraMatrix, distortion) <= self.maxError
+        if not ok:
+            self.warmMisses += 1 if self.rvec is not None else 0
+            ok, rvec, tvec = cv2.solvePnP(MODEL, corners, cameraMatrix, distortion)
+        if not ok or tvec[2, 0] <= 0: # behind the camera, start from scratch next time
+            self.reset()
+            return None
+        self.rvec, self.tvec = rvec, tvec
+
+        x, z = tvec[0, 0], tvec[2, 0]
+        rotation = cv2.Rodrigues(rvec)[0]
+        distance = math.hypot(x, z)
+        yaw = math.degrees(math.atan2(x, z))
+        skew = math.degrees(math.atan2(rotation[0, 2], rotation[2, 2])) # the target's facing direction round the vertical
+        return distance, yaw, skew
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# Smooths the target between frames and keeps it going through short gaps.
+# Each of tape1 x/y, tape2 x/y and avgArea is a constant velocity Kalman
+# filter. They are independent, so they are kept as five 2x2 filters side by
+# side in arrays rather than one 10x10 one. A measurement that jumps further
+# than the filter thinks possible (a different target) starts it again, and
+# once nothing has been measured for maxPredict seconds it gives up.
+#
+# DetectionThrottle decides which frames get full detection. When detecting
+# takes more than loadLimit of the time between frames, only every Nth frame
+# is detected and the tracker's prediction is published for the rest.
+
+import math
+import numpy as np
+
+
+class TargetTracker:
+
+    def __init__(self, positionNoise=(2000.0, 1.0), areaNoise=(2e5, 25.0), gate=6.0, maxPredict=0.3, enabled=True):
+        # (process noise, measurement noise) for positions in pixels and for the area in pixels^2
+        self.q = np.array([positionNoise[0]]*4 + [areaNoise[0]])
+        self.r = np.array([positionNoise[1]]*4 + [areaNoise[1]])
+        self.gate = gate # standard deviations a measurement can be off by before starting again
+        self.maxPredict = maxPredict
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.time = None # time of the state, None when not tracking
+        self.lastMeasured = None
+        self.p = np.zeros(5) # t1x, t1y, t2x, t2y, area
+        self.v = np.zeros(5)
+        self.P00 = np.zeros(5) # covariance of position and velocity for each
+        self.P01 = np.zeros(5)
+        self.P11 = np.zeros(5)
+
+    def tracking(self):
+        return self.time is not None
+
+    def advance(self, now):
+        dt = now - self.time
+        if dt <= 0:
+            return
+        q = self.q
+        self.p += self.v*dt
+        self.P00 += dt*(2*self.P01 + dt*self.P11) + q*dt**3/3
+        self.P01 += dt*self.P11 + q*dt**2/2
+        self.P11 += q*dt
+        self.time = now
+
+    def start(self, now, z):
+        self.time = self.lastMeasured = now
+        self.p = z.copy()
+        self.v = np.zeros(5)
+        self.P00 = self.r.copy()
+        self.P01 = np.zeros(5)
+        self.P11 = self.q*0.1 # no idea of the velocity yet
+
+    # feeds in a measured target and returns the smoothed one, now is when the
+    # frame was grabbed so time spent queued or detecting doesn't look like motion
+    def update(self, now, tape1, tape2, avgArea):
+        z = np.array([tape1[0], tape1[1], tape2[0], tape2[1], avgArea], dtype=np.float64)
+        if not self.enabled:
+            return self.result(z)
+        if not self.tracking():
+            self.start(now, z)
+            return self.result(self.p)
+        self.advance(now)
+        s = self.P00 + self.r
+        y = z - self.p
+        if np.any(np.abs(y[:4]) > self.gate*np.sqrt(s[:4])): # too far to be the same target
+            self.start(now, z)
+            return self.result(self.p)
+        k0 = self.P00/s
+        k1 = self.P01/s
+        self.p += k0*y
+        self.v += k1*y
+        self.P11 -= k1*self.P01
+        self.P01 *= 1 - k0
+        self.P00 *= 1 - k0
+        self.lastMeasured = now
+        return self.result(self.p)
+
+    # where the target should be now, None if it has not been seen for too long
+    def predict(self, now):
+        if not self.enabled or not self.tracking():
+            return None
+        if now - self.lastMeasured > self.maxPredict:
+            self.reset()
+            return None
+        self.advance(now)
+        return self.result(self.p)
+
+    # tape1, tape2, centerN, avgArea
+    def result(self, z):
+        tape1 = [float(z[0]), float(z[1])]
+        tape2 = [float(z[2]), float(z[3])]
+        return tape1, tape2, [(tape1[0] + tape2[0])/2, (tape1[1] + tape2[1])/2], float(z[4])
+
+
+class DetectionThrottle:
+
+    def __init__(self, maxEvery=4, loadLimit=0.8, smoothing=0.1, enabled=True):
+        self.maxEvery = maxEvery
+        self.loadLimit = loadLimit # fraction of the frame period detection may use
+        self.smoothing = smoothing
+        self.enabled = enabled
+        self.every = 1 # detect every this many frames
+        self.count = 0
+        self.detectTime = 0.0 # averages in seconds
+        self.period = 0.0
+        self.lastFrame = None
+
+    # call once per frame with when it was grabbed, True if it should be detected
+    def shouldDetect(self, grabbedAt):
+        if self.lastFrame is not None and grabbedAt > self.lastFrame:
+            self.period += self.smoothing*((grabbedAt - self.lastFrame) - self.period)
+        self.lastFrame = grabbedAt
+        self.count += 1
+        if not self.enabled or self.count >= self.every:
+            self.count = 0
+            return True
+        return False
+
+    # how long a full detection took
+    def detected(self, seconds):
+        self.detectTime += self.smoothing*(seconds - self.detectTime)
+        if self.enabled and self.period > 0:
+            need = self.detectTime/(self.loadLimit*self.period)
+            self.every = min(self.maxEvery, max(1, int(math.ceil(need))))
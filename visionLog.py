@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# Logging for the vision loops that can never hold up a frame. log() only
+# drops the record into a bounded ring buffer; the message is formatted and
+# written by a background thread every flushPeriod seconds. Each message key
+# has its own rate limit (rate per second, bursts of up to burst), so a message
+# that fires every frame is written a few times a second with a count of how
+# many were held back. If the writer falls behind, the oldest records are
+# dropped and counted rather than the loop waiting for the console.
+#
+#   log.info('hsvBounds', "HSV lower:%s HSV Upper:%s", lower, upper)
+#
+# Forked processes (the tape workers) start their own writer thread the first
+# time they log. The lock is made again in the child after a fork, in case the
+# writer thread held it at the moment the fork happened.
+
+from collections import deque
+import atexit
+import os
+import sys
+import threading
+import time
+
+LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+
+
+class VisionLog:
+
+    def __init__(self, capacity=256, rate=1.0, burst=5, flushPeriod=0.5, level='INFO', stream=None, enabled=True):
+        self.capacity = capacity
+        self.rate = rate # messages per second allowed for each key once its burst is used up
+        self.burst = burst
+        self.flushPeriod = flushPeriod
+        self.level = LEVELS.index(level)
+        self.stream = stream # None writes to sys.stdout
+        self.enabled = enabled
+        self.records = deque(maxlen=capacity) # (time, level, key, message, args, suppressed)
+        self.lock = threading.Lock()
+        self.limits = {} # key -> [tokens, last time, suppressed since the last one let through]
+        self.dropped = 0 # records pushed out of the ring before they were written
+        self.suppressed = 0 # records held back by the rate limits
+        self.written = 0
+        self.thread = None
+        self.pid = None
+        atexit.register(self.flush)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.afterFork)
+
+    def debug(self, key, message, *args):
+        self.log(0, key, message, args)
+
+    def info(self, key, message, *args):
+        self.log(1, key, message, args)
+
+    def warning(self, key, message, *args):
+        self.log(2, key, message, args)
+
+    def error(self, key, message, *args):
+        self.log(3, key, message, args)
+
+    def log(self, level, key, message, args):
+        if not self.enabled or level < self.level:
+            return
+        now = time.monotonic()
+        with self.lock:
+            limit = self.limits.get(key)
+            if limit is None:
+                limit = self.limits[key] = [self.burst, now, 0]
+            else:
+                limit[0] = min(self.burst, limit[0] + (now - limit[1])*self.rate)
+                limit[1] = now
+            if limit[0] < 1:
+                limit[2] += 1
+                self.suppressed += 1
+                return
+            limit[0] -= 1
+            if len(self.records) == self.capacity:
+                self.dropped += 1
+            self.records.append((time.time(), level, key, message, args, limit[2]))
+            limit[2] = 0
+        if self.pid != os.getpid():
+            self.start()
+
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name="VisionLog", daemon=True)
+            self.thread.start()
+
+    # the parent's writer thread isn't in the child and its records are the parent's to write
+    def afterFork(self):
+        self.lock = threading.Lock()
+        self.records.clear()
+        self.thread = None
+        self.pid = None
+
+    def run(self):
+        while True:
+            time.sleep(self.flushPeriod)
+            self.flush()
+
+    # writes everything in the ring, normally called from the writer thread
+    def flush(self):
+        with self.lock:
+            records = list(self.records)
+            self.records.clear()
+        if not records:
+            return
+        lines = []
+        for at, level, key, message, args, suppressed in records:
+            try:
+                text = message % args if args else message
+            except (TypeError, ValueError) as err:
+                text = "{} {!r} ({})".format(message, args, err)
+            stamp = time.strftime("%H:%M:%S", time.localtime(at)) + ".%03d" % int((at % 1)*1000)
+            line = "{} {:7s} {}: {}".format(stamp, LEVELS[level], key, text)
+            if suppressed:
+                line += " ({} suppressed)".format(suppressed)
+            lines.append(line + "\n")
+        stream = self.stream or sys.stdout
+        try:
+            stream.write("".join(lines))
+            stream.flush()
+        except (OSError, ValueError): # console gone or closed at exit
+            return
+        self.written += len(lines)
+
+    def publish(self, sd):
+        sd.putNumber('logWritten', self.written)
+        sd.putNumber('logSuppressed', self.suppressed)
+        sd.putNumber('logDropped', self.dropped)
+
+
+# the log all the vision scripts share
+log = VisionLog()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# Packs everything the robot needs from one frame into a single number array,
+# so it can never read tape1 from one frame and centerN from the next, and
+# it goes out as one NetworkTables update. After the put the table is flushed
+# so the update is sent straight away instead of on the next periodic send.
+#
+# visionResult = [seq, captureTime, valid, tape1 x, tape1 y, tape2 x, tape2 y,
+#                 centerN x, centerN y, avgArea, distance, angle]
+#
+#   seq          frame number from the capture, gaps are frames that were dropped
+#   captureTime  cscore frame time in microseconds
+#   valid        0 nothing found, 1 measured this frame, 2 predicted by the tracker
+#   distance     inches to the target from solvePnP, -1 without a full target
+#   angle        degrees to the target, positive to the right
+
+from recordingTable import ForwardingTable
+
+FIELDS = ['seq', 'captureTime', 'valid', 'tape1X', 'tape1Y', 'tape2X', 'tape2Y',
+          'centerX', 'centerY', 'avgArea', 'distance', 'angle']
+
+# keys that are only sent inside the packed array when separate is False
+PACKED_KEYS = ['targetMeasured', 'tape1', 'tape2', 'centerN', 'avgArea', 'targetDistance', 'targetYaw']
+
+
+class ResultTable(ForwardingTable):
+
+    def __init__(self, sd, flush=None, key='visionResult', separate=True):
+        ForwardingTable.__init__(self, sd)
+        self.flush = flush # e.g. ntinst.flush
+        self.key = key
+        self.separate = separate # also put the packed values under their own keys
+        self.published = 0
+
+    def put(self, method, key, value):
+        if self.separate or key not in PACKED_KEYS:
+            return ForwardingTable.put(self, method, key, value)
+        self.values[key] = value
+        return True
+
+    # forgets the last frame's values, call before the detector runs
+    def begin(self):
+        self.values = {}
+        self.clear()
+        return self
+
+    def record(self, seq, captureTime):
+        values = self.values
+        neg = [-1, -1]
+        tape1 = values.get('tape1', neg)
+        tape2 = values.get('tape2', neg)
+        centerN = values.get('centerN', neg)
+        if list(centerN) == neg:
+            valid = 0
+        else:
+            valid = 1 if values.get('targetMeasured', True) else 2
+        return [seq, captureTime, valid, tape1[0], tape1[1], tape2[0], tape2[1], centerN[0], centerN[1],
+                values.get('avgArea', -1), values.get('targetDistance', -1), values.get('targetYaw', 0)]
+
+    # puts the packed result of the frame and sends it
+    def publish(self, seq, captureTime):
+        self.sd.putNumberArray(self.key, self.record(seq, captureTime))
+        if self.flush is not None:
+            self.flush()
+        self.published += 1